@@ -0,0 +1,164 @@
+"""
+Batch re-evaluation of stored answers.
+
+Streams answered InterviewQA rows in id order (keyset pagination, so memory
+stays flat), evaluates them through the shared LLM client with bounded
+concurrency, and writes scores back one transaction per batch through the
+ORM, so the per-row performance aggregate hooks keep the dashboards current
+batch by batch. Progress is
+checkpointed after every batch so an interrupted run resumes where it stopped.
+Rows whose evaluation failed are kept in the checkpoint and re-tried with
+--retry-failed; dry runs never touch the checkpoint.
+
+    python -m Evaluation_module.batch_evaluation --batch-size 200 --concurrency 8
+    python -m Evaluation_module.batch_evaluation --retry-failed
+"""
+import time
+import datetime
+import argparse
+import threading
+from Evaluation_module.evaluation import evaluate_answer, extract_evaluation
+from Question_generation.llm_utils import get_llm_client
+from Question_generation.Retrivel import retrieve_many
+from Question_generation.models import InterviewQA, Session
+from Question_generation.checkpoints import load_checkpoint, save_checkpoint
+
+DEFAULT_CHECKPOINT = "reevaluation_checkpoint.json"
+EMPTY_CHECKPOINT = {"last_id": 0, "evaluated": 0, "failed": []}
+
+
+def iter_answered_batches(db, after_id=0, batch_size=200, difficulty=None):
+    """Yield lists of (id, question, answer, difficulty) tuples with id > after_id, in id order"""
+    while True:
+        query = db.query(InterviewQA.id, InterviewQA.question, InterviewQA.answer, InterviewQA.difficulty) \
+            .filter(InterviewQA.id > after_id, InterviewQA.answer.isnot(None), InterviewQA.answer != "")
+        if difficulty:
+            query = query.filter(InterviewQA.difficulty == difficulty)
+        rows = query.order_by(InterviewQA.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def iter_rows_by_id(db, row_ids, batch_size=200):
+    """Yield the given rows as (id, question, answer, difficulty) batches, in id order"""
+    row_ids = sorted(set(row_ids))
+    for start in range(0, len(row_ids), batch_size):
+        rows = db.query(InterviewQA.id, InterviewQA.question, InterviewQA.answer, InterviewQA.difficulty) \
+            .filter(InterviewQA.id.in_(row_ids[start:start + batch_size])).order_by(InterviewQA.id).all()
+        if rows:
+            yield rows
+
+
+def evaluate_batch(rows, concurrency, api_key=None):
+    """Evaluate rows with at most `concurrency` LLM calls in flight; returns {id: completion or Exception}"""
+    client = get_llm_client()
+    # Guidelines for the whole batch in one encode and one vector query
+    contexts = retrieve_many([question for _, question, _, _ in rows], k=3)
+    slots = threading.BoundedSemaphore(concurrency)
+    futures = {}
+    for (row_id, question, answer, difficulty), context in zip(rows, contexts):
+        slots.acquire()
+        try:
+            future = client.submit(evaluate_answer(question, answer, difficulty, context=context), api_key)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda f: slots.release())
+        futures[row_id] = future
+
+    results = {}
+    for row_id, future in futures.items():
+        try:
+            results[row_id] = future.result()
+        except Exception as e:
+            results[row_id] = e
+    return results
+
+
+def reevaluate_answers(batch_size=200, concurrency=8, checkpoint_path=DEFAULT_CHECKPOINT,
+                       restart=False, difficulty=None, dry_run=False, api_key=None, retry_failed=False):
+    """
+    Re-score every answered row, or with retry_failed only the rows whose
+    evaluation failed in earlier runs; returns the final checkpoint dict.
+    A dry run reads the checkpoint but never saves it.
+    """
+    checkpoint = load_checkpoint(None if restart else checkpoint_path, EMPTY_CHECKPOINT)
+    if retry_failed:
+        print(f"Retrying {len(checkpoint['failed'])} failed rows")
+    elif checkpoint["last_id"]:
+        print(f"Resuming after row ID {checkpoint['last_id']} ({checkpoint['evaluated']} already evaluated)")
+
+    db = Session()
+    started = time.time()
+    try:
+        if retry_failed:
+            batches = iter_rows_by_id(db, checkpoint["failed"], batch_size)
+        else:
+            batches = iter_answered_batches(db, checkpoint["last_id"], batch_size, difficulty)
+        for rows in batches:
+            results = evaluate_batch(rows, concurrency, api_key)
+
+            updates = []
+            failed = set(checkpoint["failed"])
+            for row_id, completion in results.items():
+                if isinstance(completion, Exception):
+                    print(f"⚠️ Evaluation failed for row ID {row_id}: {completion}")
+                    failed.add(row_id)
+                    continue
+                failed.discard(row_id)
+                score, reason, improvement = extract_evaluation(completion)
+                updates.append((row_id, score, f"Reason: {reason}\nImprovement Areas: {improvement}"))
+
+            if updates and not dry_run:
+                # Assign through ORM objects so the flush hooks move each row's aggregate contribution
+                scored = {row.id: row for row in db.query(InterviewQA).filter(
+                    InterviewQA.id.in_([row_id for row_id, _, _ in updates]))}
+                now = datetime.datetime.utcnow()
+                for row_id, score, feedback in updates:
+                    row = scored.get(row_id)
+                    if row is None:
+                        continue
+                    row.score = score
+                    row.feedback = feedback
+                    row.scored_at = row.scored_at or now
+                db.commit()
+
+            # Each failed row is listed once and leaves the list when it finally scores
+            checkpoint["failed"] = sorted(failed)
+            if not retry_failed:
+                checkpoint["last_id"] = rows[-1][0]
+            checkpoint["evaluated"] += len(updates)
+            if not dry_run:
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.time() - started
+            print(f"✅ Re-evaluated up to row ID {checkpoint['last_id']}: "
+                  f"{checkpoint['evaluated']} scored, {len(checkpoint['failed'])} failed, {elapsed:.0f}s elapsed")
+    finally:
+        db.close()
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored interview answers with the current evaluation prompt")
+    parser.add_argument("--batch-size", type=int, default=200, help="rows fetched and committed per transaction")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum LLM calls in flight")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="checkpoint file used to resume interrupted runs")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    parser.add_argument("--difficulty", help="only re-evaluate rows of this difficulty")
+    parser.add_argument("--retry-failed", action="store_true", help="only re-evaluate rows that failed in earlier runs")
+    parser.add_argument("--dry-run", action="store_true", help="evaluate but write neither scores nor the checkpoint")
+    args = parser.parse_args()
+
+    result = reevaluate_answers(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        difficulty=args.difficulty,
+        dry_run=args.dry_run,
+        retry_failed=args.retry_failed
+    )
+    print(f"Done: {result['evaluated']} answers re-scored, {len(result['failed'])} failed")
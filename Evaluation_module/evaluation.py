@@ -58,9 +58,10 @@ def extract_evaluation(eval_text):
 
     return score, reason, improvement
 
-def evaluate_answer(question, answer, difficulty):
-    # Try to get relevant context from ChromaDB
-    context = retrieve_docs_from_all_collections(question, k=3)
+def evaluate_answer(question, answer, difficulty, context=None):
+    # Try to get relevant context from ChromaDB, unless the caller already retrieved it
+    if context is None:
+        context = retrieve_docs_from_all_collections(question, k=3)
     # context = context[0] if context else None  # Get first matching document if available
     
     # Generate evaluation prompt
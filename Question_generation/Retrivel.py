@@ -1,47 +1,470 @@
-from PyPDF2 import PdfReader
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
+import time
+import threading
+from collections import OrderedDict
 
-# Initialize ChromaDB client and collection
+# ChromaDB and the sentence encoder are heavy to import and load, so both are
+# initialized lazily (and exactly once) on first use or by warm_up().
 CHROMA_PATH = "./chroma_db"
 COLLECTION_NAME = "all_interview_data"
-client = chromadb.PersistentClient(path=CHROMA_PATH)
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "256"))
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "1024"))
+RETRIEVAL_VERSION_CHECK = float(os.environ.get("RETRIEVAL_VERSION_CHECK", "30"))  # seconds between count() checks
+# Write counter shared by every process that writes the collection (app workers, ingest runs)
+COLLECTION_WRITES_PATH = os.environ.get("COLLECTION_WRITES_PATH", "./collection_writes")
+# "chroma" queries the collection directly; "numpy" searches a memory-mapped snapshot of it
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "chroma")
+VECTOR_INDEX_AUTO_REBUILD = os.environ.get("VECTOR_INDEX_AUTO_REBUILD", "1") == "1"
+# BM25 in front of dense retrieval: off, prefilter, fastpath or fusion
+LEXICAL_MODE = os.environ.get("LEXICAL_MODE", "off")
+LEXICAL_CUTOFF = float(os.environ.get("LEXICAL_CUTOFF", "0.8"))   # share of query IDF mass a keyword hit must match
+LEXICAL_CANDIDATES = int(os.environ.get("LEXICAL_CANDIDATES", "100"))   # prefilter / fusion depth
+# When set, retrieval is delegated to the shared service on this Unix socket
+RETRIEVAL_SERVICE_SOCKET = os.environ.get("RETRIEVAL_SERVICE_SOCKET")
+RETRIEVAL_REPROBE_INTERVAL = float(os.environ.get("RETRIEVAL_REPROBE_INTERVAL", "10"))  # seconds between warm-up retries
 
-# Load single collection
-try:
-    collection = client.get_collection(COLLECTION_NAME)
-except Exception as e:
-    print(f"⚠️ Error loading collection '{COLLECTION_NAME}': {e}")
-    collection = None
+_init_lock = threading.RLock()
+_client = None
+_collection = None
+_collection_loaded = False
+_model = None
+_vector_index = None
+_vector_index_version = None
+_lexical_index = None
+_lexical_index_version = None
+_service_client = None
+_ready = threading.Event()
+_status = {"error": None, "collection_error": None, "load_seconds": None}
+_probe_lock = threading.Lock()
+_probe = {"running": False, "started_at": 0.0}
 
-# Initialize SentenceTransformer model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
 
-def retrieve_docs_from_all_collections(query: str, k: int = 5) -> list:
+class LRUCache:
+    """Small thread-safe LRU map with hit/miss counters"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+_results_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
+# The shared write counter and the collection size, both re-read periodically, so writes
+# from any process (including upserts that keep the size) invalidate cached results and indexes.
+_version = {"writes": 0, "count": None, "checked_at": 0.0}
+
+
+def read_collection_writes(path=COLLECTION_WRITES_PATH):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_collection_writes(path=COLLECTION_WRITES_PATH):
+    """Increment the shared write counter under an exclusive file lock; returns the new value"""
+    import fcntl
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                writes = int(f.read().strip() or 0) + 1
+            except ValueError:
+                writes = 1
+            f.seek(0)
+            f.truncate()
+            f.write(str(writes))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return writes
+
+
+def get_client():
+    """Shared ChromaDB client, created on first use"""
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _client
+
+
+def get_collection():
+    """The interview collection, or None if it could not be loaded"""
+    global _collection, _collection_loaded
+    if not _collection_loaded:
+        with _init_lock:
+            if not _collection_loaded:
+                try:
+                    _collection = get_client().get_collection(COLLECTION_NAME)
+                except Exception as e:
+                    print(f"⚠️ Error loading collection '{COLLECTION_NAME}': {e}")
+                    _status["collection_error"] = str(e)
+                    _collection = None
+                _collection_loaded = True
+    return _collection
+
+
+def get_model():
+    """Shared SentenceTransformer (backend per EMBEDDING_BACKEND), loaded on first use"""
+    global _model
+    if _model is None:
+        with _init_lock:
+            if _model is None:
+                from Question_generation.encoders import load_encoder
+                _model = load_encoder(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+def get_vector_index(collection, version):
     """
-    Retrieves top-k relevant documents from the single ChromaDB collection.
+    The NumPy index for the current collection version. An index on disk is
+    reused when it matches the collection size, write counter and storage format; otherwise it is rebuilt from
+    Chroma (unless VECTOR_INDEX_AUTO_REBUILD=0, in which case the stale snapshot
+    is served until rebuilt explicitly). The check and rebuild hold the index's
+    cross-process build lock, so workers that notice a change together rebuild once.
+    """
+    global _vector_index, _vector_index_version
+    if _vector_index is not None and _vector_index_version == version:
+        return _vector_index
+    with _init_lock:
+        if _vector_index is not None and _vector_index_version == version:
+            return _vector_index
+        from Question_generation.vector_index import NumpyVectorIndex, VECTOR_INDEX_PATH
+        from Question_generation.index_files import build_lock
+        with build_lock(VECTOR_INDEX_PATH):
+            index = NumpyVectorIndex()
+            if index.exists():
+                index.load()
+            fresh = index.is_current(version[1], version[0])
+            if not fresh and (VECTOR_INDEX_AUTO_REBUILD or index.meta is None):
+                index = NumpyVectorIndex.build_from_collection(collection, collection_writes=version[0])
+        _vector_index, _vector_index_version = index, version
+        return _vector_index
+
+
+def get_lexical_index(collection, version):
+    """The BM25 index for the current collection version, rebuilt from Chroma (under the build lock) when the collection changes"""
+    global _lexical_index, _lexical_index_version
+    if _lexical_index is not None and _lexical_index_version == version:
+        return _lexical_index
+    with _init_lock:
+        if _lexical_index is not None and _lexical_index_version == version:
+            return _lexical_index
+        from Question_generation.lexical_index import BM25Index, LEXICAL_INDEX_PATH
+        from Question_generation.index_files import build_lock
+        with build_lock(LEXICAL_INDEX_PATH):
+            index = BM25Index()
+            if index.exists():
+                index.load()
+            if not index.is_current(version[1], version[0]):
+                index = BM25Index.build_from_collection(collection, collection_writes=version[0])
+        _lexical_index, _lexical_index_version = index, version
+        return _lexical_index
+
+
+def get_service_client():
+    """Client for the shared retrieval service, created on first use"""
+    global _service_client
+    if _service_client is None:
+        with _init_lock:
+            if _service_client is None:
+                from Question_generation.retrieval_service import RetrievalServiceClient
+                _service_client = RetrievalServiceClient(RETRIEVAL_SERVICE_SOCKET)
+    return _service_client
+
+
+def warm_up():
+    """Load the encoder and collection and run one encode so the first request pays nothing"""
+    started = time.time()
+    try:
+        if RETRIEVAL_SERVICE_SOCKET:
+            # The service owns the model; just check that it is up
+            service = get_service_client().ping()
+            if not service.get("ready"):
+                raise RuntimeError(f"retrieval service not ready: {service.get('error')}")
+            _status["load_seconds"] = round(time.time() - started, 2)
+            _status["error"] = None
+            print(f"✅ Retrieval service reachable at {RETRIEVAL_SERVICE_SOCKET}")
+            return
+        get_model().encode("warm up", show_progress_bar=False)
+        collection = get_collection()
+        if collection is not None and RETRIEVAL_BACKEND == "numpy":
+            get_vector_index(collection, collection_version(collection))
+        if collection is not None and LEXICAL_MODE != "off":
+            get_lexical_index(collection, collection_version(collection))
+        _status["load_seconds"] = round(time.time() - started, 2)
+        _status["error"] = None
+        print(f"✅ Retriever ready in {_status['load_seconds']}s")
+    except Exception as e:
+        _status["error"] = str(e)
+        print(f"⚠️ Retriever warm-up failed: {e}")
+    finally:
+        _ready.set()
+
+
+def start_warm_up():
+    """Warm up in a background thread; returns immediately"""
+    thread = threading.Thread(target=warm_up, name="retriever-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _reprobe():
+    """Retry a failed warm-up in the background, at most once per RETRIEVAL_REPROBE_INTERVAL"""
+    with _probe_lock:
+        if _probe["running"] or time.time() - _probe["started_at"] < RETRIEVAL_REPROBE_INTERVAL:
+            return
+        _probe["running"], _probe["started_at"] = True, time.time()
+
+    def probe():
+        try:
+            warm_up()
+        finally:
+            _probe["running"] = False
+
+    threading.Thread(target=probe, name="retriever-reprobe", daemon=True).start()
+
+
+def is_ready():
+    """True once warm-up finished with a working encoder or service (a missing collection only degrades retrieval)"""
+    loaded = _model is not None or bool(RETRIEVAL_SERVICE_SOCKET)
+    return _ready.is_set() and loaded and _status["error"] is None
+
+
+def readiness():
+    """Loading state of the retriever, for the readiness endpoint; a failed warm-up is retried in the background"""
+    if _ready.is_set() and _status["error"] is not None:
+        _reprobe()
+    return {
+        "ready": is_ready(),
+        "model_loaded": _model is not None,
+        "collection_loaded": _collection is not None,
+        "error": _status["error"],
+        "collection_error": _status["collection_error"],
+        "load_seconds": _status["load_seconds"]
+    }
+
+
+def collection_version(collection):
+    """Cache version of the collection: (shared write counter, document count)"""
+    now = time.time()
+    if _version["count"] is None or now - _version["checked_at"] > RETRIEVAL_VERSION_CHECK:
+        _version["writes"] = read_collection_writes()
+        try:
+            _version["count"] = collection.count()
+        except Exception as e:
+            print(f"⚠️ Could not read size of collection '{COLLECTION_NAME}': {e}")
+        _version["checked_at"] = now
+    return _version["writes"], _version["count"]
+
+
+def invalidate_retrieval_cache():
+    """Drop cached results; called whenever the collection is written to"""
+    try:
+        _version["writes"] = bump_collection_writes()
+    except OSError as e:
+        print(f"⚠️ Could not update the collection write counter: {e}")
+        _version["writes"] += 1
+    _version["count"] = None
+    _results_cache.clear()
+
+
+def encode_query(query):
+    """Query embedding as a list of floats, memoized in an LRU"""
+    return encode_queries([query])[0]
+
+
+def retrieval_cache_stats():
+    return {
+        "results": _results_cache.stats(),
+        "embeddings": _embedding_cache.stats(),
+        "version": {"writes": _version["writes"], "count": _version["count"]}
+    }
+
+
+def adopt_collection(collection):
+    """Serve a collection that was just written to (it may not have existed at startup) and drop cached results"""
+    global _collection, _collection_loaded
+    with _init_lock:
+        _collection, _collection_loaded = collection, True
+    invalidate_retrieval_cache()
+
+
+def encode_queries(queries):
+    """Embeddings for several queries; the ones not in the LRU are encoded in a single batch"""
+    embeddings = [_embedding_cache.get(query) for query in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    if missing:
+        encoded = dict(zip(missing, get_model().encode(missing, show_progress_bar=False).tolist()))
+        for query, embedding in encoded.items():
+            _embedding_cache.put(query, embedding)
+        embeddings = [encoded[q] if e is None else e for q, e in zip(queries, embeddings)]
+    return embeddings
+
+
+def _dense_search(collection, version, queries, k):
+    """Top-k documents per query from the configured vector backend"""
+    if not queries:
+        return []
+    embeddings = encode_queries(queries)
+    if RETRIEVAL_BACKEND == "numpy":
+        return get_vector_index(collection, version).search_many(embeddings, k)
+    response = collection.query(query_embeddings=embeddings, n_results=k, include=["documents"])
+    return response.get("documents") or [[] for _ in queries]
+
+
+def _lexical_search(collection, version, queries, k):
     """
+    Retrieval with the BM25 index in front, per LEXICAL_MODE; returns {query: documents}.
+    A keyword hit is trusted when it matches at least LEXICAL_CUTOFF of the query's IDF mass.
+    """
+    import numpy as np
+    from Question_generation.lexical_index import reciprocal_rank_fusion
+    index = get_lexical_index(collection, version)
+    hits = {query: index.search(query, max(LEXICAL_CANDIDATES, k)) for query in queries}
+    found = {}
+
+    if LEXICAL_MODE == "fastpath":
+        # Queries whose top-k all match strongly are answered without the encoder
+        confident = [q for q in queries if len(hits[q]) >= k and hits[q][k - 1][2] >= LEXICAL_CUTOFF]
+        ids = {chroma_id for q in confident for chroma_id, _, _ in hits[q][:k]}
+        if ids:
+            page = collection.get(ids=list(ids), include=["documents"])
+            documents = dict(zip(page["ids"], page["documents"]))
+            for query in confident:
+                # Hits deleted from Chroma since the BM25 build leave the query to the dense search
+                answer = [documents[chroma_id] for chroma_id, _, _ in hits[query][:k] if chroma_id in documents]
+                if len(answer) >= k:
+                    found[query] = answer
+
+    elif LEXICAL_MODE == "prefilter":
+        # Dense scoring over the keyword candidates only; every query is encoded in one batch
+        # up front, so the untrusted ones hit the embedding cache in the dense fallback below
+        embeddings = dict(zip(queries, encode_queries(queries)))
+        trusted = [q for q in queries if len(hits[q]) >= k and hits[q][0][2] >= LEXICAL_CUTOFF]
+        ids = list({chroma_id for q in trusted for chroma_id, _, _ in hits[q]})
+        if ids:
+            page = collection.get(ids=ids, include=["embeddings", "documents"])
+            rows = {chroma_id: i for i, chroma_id in enumerate(page["ids"])}
+            matrix = np.asarray(page["embeddings"], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            for query in trusted:
+                candidates = [rows[chroma_id] for chroma_id, _, _ in hits[query] if chroma_id in rows]
+                if len(candidates) < k:
+                    # Too few candidates still in Chroma, leave the query to the dense search
+                    continue
+                scores = matrix[candidates] @ np.asarray(embeddings[query], dtype=np.float32)
+                found[query] = [page["documents"][candidates[i]] for i in np.argsort(-scores)[:k]]
+
+    elif LEXICAL_MODE == "fusion":
+        # Reciprocal rank fusion of the keyword and dense rankings
+        depth = max(LEXICAL_CANDIDATES, k)
+        dense = dict(zip(queries, _dense_search(collection, version, queries, depth)))
+        ids = list({chroma_id for q in queries for chroma_id, _, _ in hits[q]})
+        documents = {}
+        if ids:
+            page = collection.get(ids=ids, include=["documents"])
+            documents = dict(zip(page["ids"], page["documents"]))
+        for query in queries:
+            lexical = [documents[chroma_id] for chroma_id, _, _ in hits[query] if chroma_id in documents]
+            found[query] = reciprocal_rank_fusion([dense[query], lexical], k)
+
+    rest = [query for query in queries if query not in found]
+    found.update(zip(rest, _dense_search(collection, version, rest, k)))
+    return found
+
+
+def retrieve_many(queries: list, k: int = 5) -> list:
+    """
+    Top-k documents for each query, in the same order as queries. Cache misses
+    are encoded in one batch and searched with one batched vector query.
+    """
+    if RETRIEVAL_SERVICE_SOCKET:
+        try:
+            return get_service_client().retrieve_many(queries, k)
+        except Exception as e:
+            print(f"⚠️ Retrieval service error: {e}")
+            return [[] for _ in queries]
+
+    collection = get_collection()
     if not collection:
         print(f"⚠️ Collection '{COLLECTION_NAME}' not available.")
-        return []
-    
+        return [[] for _ in queries]
+
     try:
-        query_embedding = model.encode(query, show_progress_bar=False).tolist()
-        results = collection.query(query_embeddings=[query_embedding], n_results=k, include=["documents"])
-        return results.get("documents", [[]])[0]
+        version = collection_version(collection)
+        results = [_results_cache.get((query, k, version)) for query in queries]
+        missing = list(dict.fromkeys(q for q, r in zip(queries, results) if r is None))
+        if missing:
+            if LEXICAL_MODE != "off":
+                found = _lexical_search(collection, version, missing, k)
+            else:
+                found = dict(zip(missing, _dense_search(collection, version, missing, k)))
+            for query, documents in found.items():
+                _results_cache.put((query, k, version), tuple(documents))
+            results = [found[q] if r is None else r for q, r in zip(queries, results)]
+        return [list(documents) for documents in results]
     except Exception as e:
         print(f"⚠️ Error querying collection '{COLLECTION_NAME}': {e}")
-        return []
+        return [[] for _ in queries]
+
+
+def retrieve_docs_from_all_collections(query: str, k: int = 5) -> list:
+    """
+    Retrieves top-k relevant documents from the single ChromaDB collection.
+    Results are cached per (query, k, collection version).
+    """
+    return retrieve_many([query], k)[0]
 
-def embed_and_store(ids: list, texts: list, collection_name: str = COLLECTION_NAME, chroma_path: str = CHROMA_PATH) -> None:
+def embed_and_store(ids: list, texts: list, collection_name: str = COLLECTION_NAME, chroma_path: str = CHROMA_PATH,
+                    batch_size: int = 256) -> None:
     """
-    Embeds texts and stores them in a ChromaDB collection.
+    Embeds texts and stores them in a ChromaDB collection. Ids that are already
+    stored are skipped; the rest are encoded and upserted in bounded batches.
     """
+    from Question_generation.ingest import store_batches
     try:
-        client = chromadb.PersistentClient(path=chroma_path)
+        import chromadb
+        client = get_client() if chroma_path == CHROMA_PATH else chromadb.PersistentClient(path=chroma_path)
         collection = client.get_or_create_collection(name=collection_name)
-        embeddings = model.encode(texts, show_progress_bar=False).tolist()
-        collection.add(documents=texts, embeddings=embeddings, ids=ids)
-        print(f"✅ Stored {len(texts)} items in collection '{collection_name}'")
+        items = [(item_id, text, None) for item_id, text in zip(ids, texts)]
+        batches = (items[i:i + batch_size] for i in range(0, len(items), batch_size))
+        stored, skipped = store_batches(collection, batches)
+        print(f"✅ Stored {stored} items in collection '{collection_name}' ({skipped} already present)")
+        if chroma_path == CHROMA_PATH and collection_name == COLLECTION_NAME:
+            adopt_collection(collection)
     except Exception as e:
-        print(f"⚠️ Error storing in collection '{collection_name}': {e}")
\ No newline at end of file
+        print(f"⚠️ Error storing in collection '{collection_name}': {e}")
@@ -0,0 +1,287 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+from Question_generation.resilience import (
+    LLMError, LLMTimeoutError, CircuitBreaker, LatencyTracker, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT,
+    LLM_MAX_RETRIES, parse_retry_after
+)
+
+LLM_KEY_RATE = float(os.environ.get("LLM_KEY_RATE", "2"))              # requests per second per key
+LLM_KEY_BURST = float(os.environ.get("LLM_KEY_BURST", "4"))            # token bucket capacity per key
+LLM_KEY_CONCURRENCY = int(os.environ.get("LLM_KEY_CONCURRENCY", "8"))  # max in-flight requests per key
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "2"))   # never hedge earlier than this
+
+
+class TokenBucket:
+    """Classic token bucket; all methods are called from the event loop thread only"""
+
+    def __init__(self, rate=LLM_KEY_RATE, capacity=LLM_KEY_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def try_take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now):
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class KeySlot:
+    """Scheduling state for one API key"""
+
+    def __init__(self, api_key, rate=LLM_KEY_RATE, burst=LLM_KEY_BURST, max_in_flight=LLM_KEY_CONCURRENCY):
+        self.api_key = api_key
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+
+    def ready(self, now):
+        return self.blocked_until <= now and self.in_flight < self.max_in_flight
+
+    def block(self, seconds):
+        """Take the key out of rotation after a 429, honouring Retry-After"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.throttled += 1
+
+
+class KeyPool:
+    """
+    Treats the configured API keys as one pool: each request goes to the
+    least-loaded key that is not rate limited or cooling down after a 429.
+    Waiting only suspends the requesting coroutine, never the loop.
+    """
+
+    def __init__(self, api_keys, rate=LLM_KEY_RATE, burst=LLM_KEY_BURST, max_in_flight=LLM_KEY_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.slots = {key: KeySlot(key, rate, burst, max_in_flight) for key in api_keys if key}
+
+    def _slot_for(self, api_key):
+        # Keys outside the configured pool are pinned to their own slot
+        if api_key and api_key not in self.slots:
+            self.slots[api_key] = KeySlot(api_key, self.rate, self.burst, self.max_in_flight)
+            print("⚠️ LLM key not in the configured pool; scheduling it separately")
+        return self.slots[api_key]
+
+    async def acquire(self, api_key=None, avoid=None):
+        """
+        Wait for and reserve a slot. Keys that belong to the pool are only a hint;
+        keys in `avoid` are skipped unless nothing else is available.
+        """
+        if api_key and api_key not in self.slots:
+            candidates = [self._slot_for(api_key)]
+        else:
+            candidates = list(self.slots.values())
+        if not candidates:
+            raise LLMError("No LLM API keys configured")
+        if avoid:
+            candidates = [s for s in candidates if s.api_key not in avoid] or candidates
+
+        while True:
+            now = time.monotonic()
+            ready = [s for s in candidates if s.ready(now)]
+            ready.sort(key=lambda s: (s.in_flight, -s.bucket.available(now)))
+            for slot in ready:
+                if slot.bucket.try_take(now):
+                    slot.in_flight += 1
+                    slot.requests += 1
+                    return slot
+
+            waits = []
+            for slot in candidates:
+                if slot.blocked_until > now:
+                    waits.append(slot.blocked_until - now)
+                elif slot.in_flight < slot.max_in_flight:
+                    waits.append(slot.bucket.wait_time(now))
+            await asyncio.sleep(max(min(waits), 0.01) if waits else 0.05)
+
+    def release(self, slot):
+        slot.in_flight -= 1
+
+    def stats(self):
+        now = time.monotonic()
+        return [
+            {
+                "key": f"...{slot.api_key[-4:]}",
+                "in_flight": slot.in_flight,
+                "requests": slot.requests,
+                "throttled": slot.throttled,
+                "cooling_down": slot.blocked_until > now
+            }
+            for slot in self.slots.values()
+        ]
+
+
+class AsyncLLMClient:
+    """
+    asyncio chat-completion client running on its own event loop thread.
+
+    One httpx.AsyncClient keeps a keep-alive connection pool to the endpoint,
+    requests are scheduled over a KeyPool, and submit() hands back a
+    concurrent.futures.Future so synchronous Flask code can wait on it.
+
+    Every call has a hard deadline. Once the rolling p95 latency is known, a
+    call still running after that long is hedged with a duplicate on another
+    key; the first answer wins and the loser is cancelled. Calls are rejected
+    up front while the endpoint's circuit breaker is open.
+    """
+
+    def __init__(self, api_url, model, api_keys, pool_size=32, max_retries=LLM_MAX_RETRIES,
+                 timeout=LLM_TIMEOUT, hedge=LLM_HEDGE_ENABLED, hedge_min_delay=LLM_HEDGE_MIN_DELAY, breaker=None):
+        self.api_url = api_url
+        self.model = model
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(api_url)
+        self.latency = LatencyTracker()
+        self.key_pool = KeyPool(api_keys)
+        self._stats = {"hedged": 0, "hedge_wins": 0, "timeouts": 0}
+        self._http = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="llm-async", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _get_http(self):
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            # The overall deadline is enforced in complete(); this only bounds connection setup
+            self._http = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(None, connect=LLM_CONNECT_TIMEOUT))
+        return self._http
+
+    async def _attempt(self, messages, api_key=None, tried=None, avoid=None):
+        """One logical request, moving to another key whenever the current one answers 429"""
+        payload = {
+            "messages": messages,
+            "model": self.model
+        }
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            slot = await self.key_pool.acquire(api_key, avoid=avoid)
+            if tried is not None:
+                tried.append(slot.api_key)
+            try:
+                headers = {
+                    "Authorization": f"Bearer {slot.api_key}",
+                    "Content-Type": "application/json"
+                }
+                response = await self._get_http().post(self.api_url, headers=headers, json=payload)
+            except httpx.HTTPError as e:
+                self.breaker.record_failure()
+                raise LLMError(f"Error: {type(e).__name__}: {e}") from e
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            finally:
+                self.key_pool.release(slot)
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                raise LLMError(f"Error: {response.status_code}\n{response.text}")
+            self.breaker.record_success()
+
+            if response.status_code == 200:
+                try:
+                    return response.json()["choices"][0]["message"]["content"]
+                except (ValueError, KeyError, IndexError) as e:
+                    raise LLMError(f"Error: malformed completion response: {e}") from e
+            if response.status_code == 429 and attempt < self.max_retries:
+                attempt += 1
+                slot.block(parse_retry_after(response.headers.get("Retry-After")))
+                continue
+            raise LLMError(f"Error: {response.status_code}\n{response.text}")
+
+    def _hedge_delay(self):
+        if not self.hedge:
+            return None
+        p95 = self.latency.quantile()
+        if p95 is None:
+            return None
+        return max(p95, self.hedge_min_delay)
+
+    async def _hedged(self, messages, api_key=None):
+        tried = []
+        tasks = [asyncio.ensure_future(self._attempt(messages, api_key, tried))]
+        try:
+            delay = self._hedge_delay()
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                # Straggler: race a duplicate on a different key, first answer wins
+                self._stats["hedged"] += 1
+                tasks.append(asyncio.ensure_future(self._attempt(messages, api_key, avoid=set(tried))))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def complete(self, messages, api_key=None):
+        """Run one completion within the per-call deadline"""
+        started = time.monotonic()
+        try:
+            content = await asyncio.wait_for(self._hedged(messages, api_key), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            self.breaker.record_failure()
+            raise LLMTimeoutError(f"Error: LLM call exceeded the {self.timeout:g}s deadline")
+        self.latency.record(time.monotonic() - started)
+        return content
+
+    def submit(self, messages, api_key=None):
+        """Schedule a completion on the loop thread; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self.complete(messages, api_key), self._loop)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["keys"] = self.key_pool.stats()
+        stats["p95_latency"] = self.latency.quantile()
+        stats["hedge_delay"] = self._hedge_delay()
+        return stats
+
+    def close(self):
+        if self._http is not None:
+            asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
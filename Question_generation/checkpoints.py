@@ -0,0 +1,25 @@
+"""
+JSON checkpoint files shared by the resumable batch jobs (ingestion and
+batch re-evaluation).
+"""
+import os
+import copy
+import json
+
+
+def load_checkpoint(path, default):
+    """The saved checkpoint, or a fresh copy of default when path is unset or missing"""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return copy.deepcopy(default)
+
+
+def save_checkpoint(path, checkpoint):
+    """Write atomically so a crash mid-write never corrupts the checkpoint"""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
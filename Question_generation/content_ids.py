@@ -0,0 +1,6 @@
+import hashlib
+
+
+def content_id(text):
+    """Stable id for a piece of text: sha256 of the whitespace-normalized text"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
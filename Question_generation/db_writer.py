@@ -0,0 +1,220 @@
+"""
+InterviewQA writes, either committed in the request or queued write-behind.
+
+With DB_WRITE_BEHIND=1, inserts, updates and session archivals are queued and
+applied by one background writer thread, which commits everything that
+arrived within DB_WRITE_BEHIND_WAIT_MS (up to DB_WRITE_BEHIND_BATCH
+operations) in a single transaction. Requests no longer wait for the commit
+or for the SQLite writer lock.
+
+Reads stay consistent for the writing session: wait_for_session(session_id)
+blocks until that session's queued writes are committed, and callers invoke
+it before reading the session's rows. The queue is drained on interpreter
+exit.
+"""
+import os
+import time
+import queue
+import atexit
+import datetime
+import threading
+from Question_generation.models import InterviewQA, Session, archive_session, session as scoped_db
+
+DB_WRITE_BEHIND = os.environ.get("DB_WRITE_BEHIND", "0") == "1"
+DB_WRITE_BEHIND_BATCH = int(os.environ.get("DB_WRITE_BEHIND_BATCH", "256"))      # operations per transaction
+DB_WRITE_BEHIND_WAIT_MS = float(os.environ.get("DB_WRITE_BEHIND_WAIT_MS", "20"))  # how long a batch collects
+DB_WRITE_BEHIND_MAX_QUEUE = int(os.environ.get("DB_WRITE_BEHIND_MAX_QUEUE", "10000"))  # callers block beyond this
+DB_WRITE_BEHIND_READ_TIMEOUT = float(os.environ.get("DB_WRITE_BEHIND_READ_TIMEOUT", "5"))
+
+
+class DirectWriter:
+    """Commits every write in the calling request (the default)"""
+
+    def __init__(self, db=scoped_db):
+        self.db = db
+
+    def insert(self, **values):
+        row = InterviewQA(**values)
+        self.db.add(row)
+        self.db.commit()
+        return row
+
+    def update(self, row, **values):
+        for key, value in values.items():
+            setattr(row, key, value)
+        self.db.commit()
+        return row
+
+    def archive_session(self, session_id):
+        archive_session(self.db, session_id)
+        self.db.commit()
+
+    def wait_for_session(self, session_id, timeout=None):
+        return True
+
+    def flush(self, timeout=None):
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"mode": "direct"}
+
+
+class WriteBehindWriter:
+    """
+    Queues writes for a background thread that applies them in order, in
+    batched transactions. A batch that fails is retried one operation per
+    transaction, so a single bad write only loses itself.
+    """
+
+    def __init__(self, session_factory=Session, db=scoped_db, max_batch=DB_WRITE_BEHIND_BATCH,
+                 max_wait=DB_WRITE_BEHIND_WAIT_MS / 1000, max_queue=DB_WRITE_BEHIND_MAX_QUEUE):
+        self.session_factory = session_factory
+        self.db = db
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}   # session_id -> queued operations not yet committed
+        self._condition = threading.Condition()
+        self._closed = False
+        self._stats = {"queued": 0, "committed": 0, "failed": 0, "batches": 0, "largest_batch": 0}
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, session_id, op, *args):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+            self._stats["queued"] += 1
+        self._queue.put((session_id, op, args))
+
+    def insert(self, **values):
+        # Stamp the row now so its timestamp is the request's, not the commit's
+        values.setdefault("timestamp", datetime.datetime.utcnow())
+        row = InterviewQA(**values)
+        self._enqueue(row.session_id, "insert", values)
+        return row
+
+    def update(self, row, **values):
+        # Detach the row so the request's session never flushes it; the writer owns the UPDATE
+        row_id, session_id = row.id, row.session_id
+        if row in self.db:
+            self.db.expunge(row)
+        for key, value in values.items():
+            setattr(row, key, value)
+        self._enqueue(session_id, "update", row_id, values)
+        return row
+
+    def archive_session(self, session_id):
+        self._enqueue(session_id, "archive_session", session_id, datetime.datetime.utcnow())
+
+    def _apply(self, db, op, args):
+        if op == "insert":
+            db.add(InterviewQA(**args[0]))
+        elif op == "update":
+            row = db.get(InterviewQA, args[0])
+            if row is None:
+                print(f"⚠️ Write-behind update skipped, question ID {args[0]} no longer exists")
+                return
+            for key, value in args[1].items():
+                setattr(row, key, value)
+        elif op == "archive_session":
+            db.flush()
+            archive_session(db, args[0], args[1])
+
+    def _commit(self, items):
+        """Apply items in one transaction; returns how many failed"""
+        db = self.session_factory()
+        try:
+            for _, op, args in items:
+                self._apply(db, op, args)
+            db.commit()
+            return 0
+        except Exception as e:
+            db.rollback()
+            if len(items) == 1:
+                print(f"⚠️ Write-behind {items[0][1]} for session {items[0][0]} failed: {e}")
+                return 1
+        finally:
+            db.close()
+        return sum(self._commit([item]) for item in items)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item in batch if item is not None]
+            failed = self._commit(items) if items else 0
+            with self._condition:
+                for session_id, _, _ in items:
+                    self._pending[session_id] -= 1
+                    if not self._pending[session_id]:
+                        del self._pending[session_id]
+                if items:
+                    self._stats["committed"] += len(items) - failed
+                    self._stats["failed"] += failed
+                    self._stats["batches"] += 1
+                    self._stats["largest_batch"] = max(self._stats["largest_batch"], len(items))
+                self._condition.notify_all()
+            if None in batch:
+                return
+
+    def wait_for_session(self, session_id, timeout=DB_WRITE_BEHIND_READ_TIMEOUT):
+        """Block until every write queued for session_id is committed (read-your-writes)"""
+        with self._condition:
+            done = self._condition.wait_for(lambda: session_id not in self._pending, timeout)
+        if not done:
+            print(f"⚠️ Writes for session {session_id} still pending after {timeout}s, reading anyway")
+        return done
+
+    def flush(self, timeout=DB_WRITE_BEHIND_READ_TIMEOUT):
+        """Block until every queued write is committed"""
+        with self._condition:
+            done = self._condition.wait_for(lambda: not self._pending, timeout)
+        if not done:
+            print(f"⚠️ Write-behind queue not drained after {timeout}s")
+        return done
+
+    def close(self, timeout=30):
+        """Stop accepting writes and drain the queue (registered with atexit)"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ Write-behind queue not drained on shutdown ({self._queue.qsize()} writes left)")
+        else:
+            print(f"✅ Write-behind queue drained ({self._stats['committed']} writes committed)")
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats["pending"] = sum(self._pending.values())
+            stats["pending_sessions"] = len(self._pending)
+        stats["mode"] = "write-behind"
+        return stats
+
+
+def create_db_writer():
+    if not DB_WRITE_BEHIND:
+        return DirectWriter()
+    writer = WriteBehindWriter()
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,149 @@
+"""
+Sentence encoder backends for CPU inference.
+
+EMBEDDING_BACKEND selects how all-MiniLM-L6-v2 runs:
+    torch  full-precision PyTorch (reference)
+    int8   PyTorch with dynamic int8 quantization of the Linear layers
+    onnx   ONNX Runtime through sentence-transformers (needs optimum[onnxruntime])
+
+EMBEDDING_THREADS caps intra-op threads (0 keeps the library default). The
+parity check compares a backend against the reference on corpus text:
+
+    python -m Question_generation.encoders --backend int8 --sample 500
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE")   # e.g. onnx/model_qint8_avx2.onnx
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def _load_onnx(model_name, threads):
+    from sentence_transformers import SentenceTransformer
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if EMBEDDING_ONNX_FILE:
+        model_kwargs["file_name"] = EMBEDDING_ONNX_FILE
+    if threads:
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        model_kwargs["session_options"] = options
+    return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+def _load_int8(model_name):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def load_encoder(model_name, backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS, fallback=True):
+    """
+    SentenceTransformer for the requested backend, falling back to torch if it
+    cannot be loaded; with fallback=False the load error is raised instead.
+    """
+    if backend not in BACKENDS:
+        if not fallback:
+            raise ValueError(f"unknown encoder backend '{backend}'")
+        print(f"⚠️ Unknown EMBEDDING_BACKEND '{backend}', using torch")
+        backend = "torch"
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    started = time.time()
+    try:
+        if backend == "onnx":
+            model = _load_onnx(model_name, threads)
+        elif backend == "int8":
+            model = _load_int8(model_name)
+        else:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+    except Exception as e:
+        if backend == "torch" or not fallback:
+            raise
+        print(f"⚠️ Could not load {backend} encoder ({e}), using torch")
+        return load_encoder(model_name, "torch", threads)
+    print(f"✅ Loaded {model_name} ({backend} backend) in {time.time() - started:.1f}s")
+    return model
+
+
+def _sample_corpus(sample):
+    from Question_generation.Retrivel import get_collection
+    collection = get_collection()
+    if collection is None:
+        raise SystemExit("⚠️ Collection not available; pass --file with sample texts instead")
+    return collection.get(limit=sample, include=["documents"])["documents"]
+
+
+def _timed_encode(model, texts, batch_size):
+    started = time.time()
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32), time.time() - started
+
+
+def parity_check(model_name, backend, texts, batch_size=32, threads=EMBEDDING_THREADS, k=3):
+    """
+    Cosine drift, neighbour agreement and encode time of a backend against the
+    torch reference. The backend is loaded strictly: if it cannot be loaded the
+    check fails rather than silently comparing torch with torch.
+    """
+    candidate_model = load_encoder(model_name, backend, threads, fallback=False)
+    reference, reference_seconds = _timed_encode(load_encoder(model_name, "torch", threads), texts, batch_size)
+    candidate, candidate_seconds = _timed_encode(candidate_model, texts, batch_size)
+    cosine = np.sum(reference * candidate, axis=1)
+
+    # Do the texts keep the same top-k neighbours within the sample?
+    k = min(k, len(texts) - 1)
+    overlap = None
+    if k > 0:
+        ref_scores, cand_scores = reference @ reference.T, candidate @ candidate.T
+        np.fill_diagonal(ref_scores, -np.inf)
+        np.fill_diagonal(cand_scores, -np.inf)
+        ref_top = np.argsort(-ref_scores, axis=1)[:, :k]
+        cand_top = np.argsort(-cand_scores, axis=1)[:, :k]
+        overlap = float(np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]))
+
+    return {
+        "backend": backend,
+        "texts": len(texts),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "cosine_p1": float(np.percentile(cosine, 1)),
+        f"top{k}_overlap": overlap,
+        "reference_ms_per_text": 1000 * reference_seconds / len(texts),
+        "backend_ms_per_text": 1000 * candidate_seconds / len(texts)
+    }
+
+
+if __name__ == "__main__":
+    from Question_generation.Retrivel import EMBEDDING_MODEL_NAME
+    parser = argparse.ArgumentParser(description="Compare an encoder backend against the full-precision reference")
+    parser.add_argument("--backend", choices=BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--sample", type=int, default=500, help="corpus documents to encode")
+    parser.add_argument("--file", help="newline-separated texts to use instead of the collection")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.sample]
+    else:
+        texts = _sample_corpus(args.sample)
+    if not texts:
+        raise SystemExit("⚠️ No texts to compare")
+
+    try:
+        report = parity_check(EMBEDDING_MODEL_NAME, args.backend, texts, args.batch_size, args.threads)
+    except Exception as e:
+        raise SystemExit(f"⚠️ Parity check failed, could not load the {args.backend} encoder: {e}")
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,131 @@
+"""
+Streaming export of stored interviews, archived ones included.
+
+Rows are read with yield_per, so memory stays flat however many months of
+interviews are stored, and written as NDJSON (one JSON object per line) or as
+Parquet (needs pyarrow) one row group per chunk. Filters: date range on the
+question timestamp, user, session, and whether archived interviews are
+included.
+
+    python -m Question_generation.export --since 2026-01-01 --format parquet -o interviews.parquet
+"""
+import os
+import sys
+import json
+import datetime
+import argparse
+from sqlalchemy import Boolean, DateTime, Float, Integer
+from Question_generation.models import InterviewQA, Session
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "1000"))   # rows per fetch and per Parquet row group
+EXPORT_FORMATS = ("ndjson", "parquet")
+EXPORT_COLUMNS = tuple(InterviewQA.__table__.columns)
+
+
+def parse_date(value, end=False):
+    """ISO date or datetime; a bare date used as an end bound covers that whole day"""
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += datetime.timedelta(days=1)
+    return parsed
+
+
+def export_rows(db, since=None, until=None, user_id=None, session_id=None, include_archived=True,
+                chunk_rows=EXPORT_CHUNK_ROWS):
+    """Matching rows as dicts in id order, fetched chunk_rows at a time; until is exclusive"""
+    query = db.query(*EXPORT_COLUMNS)
+    if since:
+        query = query.filter(InterviewQA.timestamp >= since)
+    if until:
+        query = query.filter(InterviewQA.timestamp < until)
+    if user_id:
+        query = query.filter(InterviewQA.user_id == user_id)
+    if session_id:
+        query = query.filter(InterviewQA.session_id == session_id)
+    if not include_archived:
+        query = query.filter(InterviewQA.archived_at.is_(None))
+    names = [column.name for column in EXPORT_COLUMNS]
+    for row in query.order_by(InterviewQA.id).yield_per(chunk_rows):
+        yield dict(zip(names, row))
+
+
+def ndjson_line(row):
+    return json.dumps({key: value.isoformat() if isinstance(value, datetime.datetime) else value
+                       for key, value in row.items()}) + "\n"
+
+
+def write_ndjson(rows, out):
+    count = 0
+    for row in rows:
+        out.write(ndjson_line(row))
+        count += 1
+    return count
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {Integer: pa.int64(), Float: pa.float64(), Boolean: pa.bool_(), DateTime: pa.timestamp("us")}
+    return pa.schema([
+        (column.name, next((arrow for sql, arrow in types.items() if isinstance(column.type, sql)), pa.string()))
+        for column in EXPORT_COLUMNS
+    ])
+
+
+def write_parquet(rows, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write rows to a Parquet file one row group per chunk; returns the row count"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow); use --format ndjson instead")
+    schema = _arrow_schema()
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                writer.write_batch(pa.RecordBatch.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_batch(pa.RecordBatch.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export stored interviews as NDJSON or Parquet")
+    parser.add_argument("-o", "--output", default="-", help="output file ('-' writes NDJSON to stdout)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="defaults from the output extension")
+    parser.add_argument("--since", help="first day (or datetime) to include, e.g. 2026-01-01")
+    parser.add_argument("--until", help="last day to include (a datetime is an exclusive bound)")
+    parser.add_argument("--user-id")
+    parser.add_argument("--session-id")
+    parser.add_argument("--active-only", action="store_true", help="leave out archived interviews")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    export_format = args.format or ("parquet" if args.output.endswith(".parquet") else "ndjson")
+    if export_format == "parquet" and args.output == "-":
+        raise SystemExit("⚠️ Parquet export needs an output file")
+
+    db = Session()
+    try:
+        rows = export_rows(db, parse_date(args.since), parse_date(args.until, end=True), args.user_id,
+                           args.session_id, not args.active_only, args.chunk_rows)
+        if export_format == "parquet":
+            try:
+                count = write_parquet(rows, args.output, args.chunk_rows)
+            except RuntimeError as e:
+                raise SystemExit(f"⚠️ {e}")
+        elif args.output == "-":
+            count = write_ndjson(rows, sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                count = write_ndjson(rows, f)
+    finally:
+        db.close()
+    print(f"✅ Exported {count} rows ({export_format})", file=sys.stderr)
@@ -0,0 +1,42 @@
+"""
+File helpers shared by the on-disk retrieval indexes.
+
+Every app worker may decide to rebuild an index at the same moment (at
+startup with no index, or once a collection change is noticed). build_lock()
+serializes those rebuilds across processes with an fcntl lock, and temp_path()
+gives each build its own temporary files, so a half-written file is never
+truncated or published by another process.
+"""
+import os
+import fcntl
+import tempfile
+from contextlib import contextmanager
+
+LOCK_FILE = ".build.lock"
+
+
+@contextmanager
+def build_lock(path):
+    """Exclusive cross-process lock on an index directory; check and rebuild the index while holding it"""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def temp_path(path, name):
+    """A new, uniquely named temporary file next to path/name, for os.replace() into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=path, prefix=f".{name}.", suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def remove_quietly(paths):
+    for tmp_path in paths:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,301 @@
+"""
+Streaming ingestion of source documents into the interview collection.
+
+Sources are read incrementally and split into overlapping chunks. Each chunk's
+id is a hash of its normalized text, so chunks that are already stored are
+skipped without being re-embedded. New chunks are encoded in fixed-size
+batches (in-process, or across a process pool with --workers) and upserted
+batch by batch. Progress is checkpointed after every upsert so a failed run
+resumes where it stopped.
+
+    python -m Question_generation.ingest hr_questions/*.txt --workers 4
+"""
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Question_generation.Retrivel import (
+    COLLECTION_NAME, CHROMA_PATH, EMBEDDING_MODEL_NAME, get_client, get_model, adopt_collection,
+    invalidate_retrieval_cache
+)
+from Question_generation.checkpoints import load_checkpoint, save_checkpoint
+from Question_generation.content_ids import content_id
+
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+INGEST_CHUNK_CHARS = int(os.environ.get("INGEST_CHUNK_CHARS", "1000"))
+INGEST_CHUNK_OVERLAP = int(os.environ.get("INGEST_CHUNK_OVERLAP", "100"))
+INGEST_JSON_MAX_BYTES = int(os.environ.get("INGEST_JSON_MAX_BYTES", str(64 * 1024 * 1024)))  # larger .json needs ijson
+DEFAULT_CHECKPOINT = "ingest_checkpoint.json"
+EMPTY_CHECKPOINT = {"sources": {}, "stored": 0, "skipped": 0}
+
+
+def _record_text(record, text_field):
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        if text_field in record:
+            return str(record[text_field])
+        return "\n".join(f"{key}: {value}" for key, value in record.items() if isinstance(value, (str, int, float)))
+    return str(record)
+
+
+def iter_source_texts(path, text_field="text"):
+    """Yield text units from a source file without loading large files whole"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        from PyPDF2 import PdfReader
+        for page in PdfReader(path).pages:
+            yield page.extract_text() or ""
+    elif extension == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _record_text(json.loads(line), text_field)
+    elif extension == ".json":
+        yield from _iter_json_records(path, text_field)
+    else:
+        # Plain text: one unit per blank-line separated paragraph
+        paragraph = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    paragraph.append(line)
+                elif paragraph:
+                    yield "".join(paragraph)
+                    paragraph = []
+        if paragraph:
+            yield "".join(paragraph)
+
+
+def _iter_json_records(path, text_field):
+    """
+    Records of a .json source. A top-level array is streamed item by item
+    with ijson when it is installed; without it, files over
+    INGEST_JSON_MAX_BYTES are refused rather than loaded whole.
+    """
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip()
+        f.seek(0)
+        if head.startswith(b"["):
+            try:
+                import ijson
+            except ImportError:
+                ijson = None
+            if ijson is not None:
+                for record in ijson.items(f, "item", use_float=True):
+                    yield _record_text(record, text_field)
+                return
+        if os.path.getsize(path) > INGEST_JSON_MAX_BYTES:
+            raise ValueError(f"{path} is too large to load whole; install ijson (pip install ijson) "
+                             f"or convert it to .jsonl")
+        data = json.load(f)
+    for record in data if isinstance(data, list) else [data]:
+        yield _record_text(record, text_field)
+
+
+def chunk_text(text, max_chars=INGEST_CHUNK_CHARS, overlap=INGEST_CHUNK_OVERLAP):
+    """Split text into chunks of at most max_chars, preferring whitespace boundaries"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            split = text.rfind(" ", start + max_chars // 2, end)
+            end = split if split != -1 else end
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [chunk for chunk in chunks if chunk]
+
+
+def iter_chunks(paths, max_chars=INGEST_CHUNK_CHARS, overlap=INGEST_CHUNK_OVERLAP, text_field="text", skip=None):
+    """
+    Yield (path, chunk_index, chunk) for every source; chunk indexes are
+    deterministic, so skip={path: n} resumes after the first n chunks of a file.
+    """
+    skip = skip or {}
+    for path in paths:
+        index = 0
+        for text in iter_source_texts(path, text_field):
+            for chunk in chunk_text(text, max_chars, overlap):
+                if index >= skip.get(path, 0):
+                    yield path, index, chunk
+                index += 1
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_in_process(texts):
+    return get_model().encode(texts, batch_size=len(texts), show_progress_bar=False).tolist()
+
+
+_worker_model = None
+
+
+def _init_worker(model_name):
+    # Each worker process loads its own encoder once
+    global _worker_model
+    from Question_generation.encoders import load_encoder
+    _worker_model = load_encoder(model_name)
+
+
+def _encode_in_worker(texts):
+    return _worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False).tolist()
+
+
+def existing_ids(collection, ids):
+    """Subset of ids already present in the collection"""
+    if not ids:
+        return set()
+    return set(collection.get(ids=list(ids), include=[])["ids"])
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def store_batches(collection, batches, workers=0, on_stored=None, on_upserted=None):
+    """
+    Encode and upsert batches of (id, text, tag) items, skipping ids already
+    stored. With workers > 0 encoding runs in a process pool with a bounded
+    number of batches in flight; upserts always happen in batch order, and
+    on_stored(batch) is called after each one. on_upserted() runs after every
+    upsert that wrote new items (e.g. to invalidate retrieval caches for the
+    live collection). Returns (stored, skipped).
+    """
+    stored = skipped = 0
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(EMBEDDING_MODEL_NAME,)) if workers > 0 else None
+    pending = deque()
+
+    def upsert_oldest():
+        nonlocal stored
+        batch, new_items, embeddings = pending.popleft()
+        if new_items:
+            embeddings = embeddings.result() if pool else embeddings
+            collection.upsert(
+                ids=[item_id for item_id, _, _ in new_items],
+                documents=[text for _, text, _ in new_items],
+                embeddings=embeddings
+            )
+            if on_upserted:
+                on_upserted()
+            stored += len(new_items)
+        if on_stored:
+            on_stored(batch)
+
+    try:
+        for batch in batches:
+            # Ids repeated within a batch are stored once
+            unique = list({item_id: (item_id, text, tag) for item_id, text, tag in batch}.values())
+            present = existing_ids(collection, [item_id for item_id, _, _ in unique])
+            new_items = [item for item in unique if item[0] not in present]
+            skipped += len(batch) - len(new_items)
+            texts = [text for _, text, _ in new_items]
+            if not new_items:
+                embeddings = None
+            elif pool:
+                embeddings = pool.submit(_encode_in_worker, texts)
+            else:
+                embeddings = _encode_in_process(texts)
+            pending.append((batch, new_items, embeddings))
+            while len(pending) > max(workers, 1):
+                upsert_oldest()
+        while pending:
+            upsert_oldest()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return stored, skipped
+
+
+def ingest(paths, collection_name=COLLECTION_NAME, chroma_path=CHROMA_PATH, batch_size=INGEST_BATCH_SIZE,
+           workers=0, checkpoint_path=DEFAULT_CHECKPOINT, restart=False, text_field="text",
+           max_chars=INGEST_CHUNK_CHARS, overlap=INGEST_CHUNK_OVERLAP):
+    """Ingest source files into the collection; returns the final checkpoint dict"""
+    import chromadb
+    client = get_client() if chroma_path == CHROMA_PATH else chromadb.PersistentClient(path=chroma_path)
+    collection = client.get_or_create_collection(name=collection_name)
+
+    checkpoint = load_checkpoint(None if restart else checkpoint_path, EMPTY_CHECKPOINT)
+    skip = {}
+    for path in paths:
+        source = checkpoint["sources"].get(path)
+        if source and source.get("fingerprint") == _fingerprint(path):
+            skip[path] = source["chunks"]
+        else:
+            # New or modified file: start it over (unchanged chunks are still skipped by id)
+            checkpoint["sources"][path] = {"fingerprint": _fingerprint(path), "chunks": 0}
+    if any(skip.values()):
+        print(f"Resuming ingestion ({sum(skip.values())} chunks already done)")
+
+    started = time.time()
+    totals = {"seen": 0}
+
+    def on_stored(batch):
+        for path, index in {(tag[0], tag[1]) for _, _, tag in batch}:
+            source = checkpoint["sources"][path]
+            source["chunks"] = max(source["chunks"], index + 1)
+        totals["seen"] += len(batch)
+        save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.time() - started
+        print(f"✅ {totals['seen']} chunks processed ({totals['seen'] / max(elapsed, 1e-6):.0f}/s)")
+
+    items = ((content_id(chunk), chunk, (path, index))
+             for path, index, chunk in iter_chunks(paths, max_chars, overlap, text_field, skip))
+    # Only writes to the collection the app serves invalidate its caches and indexes
+    live = chroma_path == CHROMA_PATH and collection_name == COLLECTION_NAME
+    try:
+        stored, skipped = store_batches(collection, _batched(items, batch_size), workers, on_stored,
+                                        on_upserted=invalidate_retrieval_cache if live else None)
+    finally:
+        if live:
+            adopt_collection(collection)
+    checkpoint["stored"] += stored
+    checkpoint["skipped"] += skipped
+    save_checkpoint(checkpoint_path, checkpoint)
+    print(f"✅ Ingested into '{collection_name}': {stored} new chunks, {skipped} already stored, "
+          f"{time.time() - started:.0f}s")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk, embed and store source documents in the interview collection")
+    parser.add_argument("paths", nargs="+", help="source files (.txt, .md, .json, .jsonl, .pdf)")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="chunks encoded and upserted per batch")
+    parser.add_argument("--workers", type=int, default=0, help="encoder processes (0 encodes in this process)")
+    parser.add_argument("--chunk-chars", type=int, default=INGEST_CHUNK_CHARS)
+    parser.add_argument("--overlap", type=int, default=INGEST_CHUNK_OVERLAP)
+    parser.add_argument("--text-field", default="text", help="field holding the text in JSON records")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="checkpoint file used to resume interrupted runs")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    args = parser.parse_args()
+
+    ingest(
+        args.paths,
+        collection_name=args.collection,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        text_field=args.text_field,
+        max_chars=args.chunk_chars,
+        overlap=args.overlap
+    )
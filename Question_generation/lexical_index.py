@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import time
+from collections import Counter
+import numpy as np
+from Question_generation.index_files import build_lock, temp_path, remove_quietly
+
+LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", "./lexical_index")
+BM25_K1 = float(os.environ.get("BM25_K1", "1.2"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+
+POSTINGS_FILE = "postings.npz"
+META_FILE = "meta.json"
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from how i in is it of on or so that the this to was what when where "
+    "which who why with you your".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Precomputed BM25 inverted index over the collection documents.
+
+    Postings are stored CSR-style: for vocabulary term t, doc_ids and term
+    frequencies live at indptr[t]:indptr[t + 1]. Documents are referenced by
+    their Chroma ids, so the texts themselves stay in Chroma.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        self.meta = None
+        self.vocabulary = {}
+        self.ids = None
+        self.indptr = None
+        self.doc_ids = None
+        self.tfs = None
+        self.doc_lengths = None
+
+    @classmethod
+    def build_from_collection(cls, collection, path=LEXICAL_INDEX_PATH, batch_size=1000, collection_writes=None):
+        """
+        Tokenize every document in the collection, page by page, and write the
+        postings. Files are written to unique temporaries and swapped in, so
+        concurrent builds never clobber each other; hold build_lock(path) to
+        also avoid building twice.
+        """
+        os.makedirs(path, exist_ok=True)
+        started = time.time()
+        count = collection.count()
+        postings = {}
+        ids, doc_lengths = [], []
+        for offset in range(0, count, batch_size):
+            page = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            if not page.get("ids"):
+                break
+            for chroma_id, document in zip(page["ids"], page.get("documents") or []):
+                doc = len(ids)
+                tokens = tokenize(document or "")
+                ids.append(chroma_id)
+                doc_lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    postings.setdefault(term, []).append((doc, tf))
+
+        vocabulary = sorted(postings)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for i, term in enumerate(vocabulary):
+            indptr[i + 1] = indptr[i] + len(postings[term])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.float32)
+        for i, term in enumerate(vocabulary):
+            entries = np.asarray(postings[term])
+            doc_ids[indptr[i]:indptr[i + 1]] = entries[:, 0]
+            tfs[indptr[i]:indptr[i + 1]] = entries[:, 1]
+
+        meta = {"count": len(ids), "terms": len(vocabulary), "collection_count": count,
+                "collection_writes": collection_writes, "built_at": time.time()}
+        postings_tmp, meta_tmp = temp_path(path, POSTINGS_FILE), temp_path(path, META_FILE)
+        try:
+            # A file object keeps np.savez from appending .npz to the temporary name
+            with open(postings_tmp, "wb") as f:
+                np.savez(f, vocabulary=np.asarray(vocabulary, dtype=str), ids=np.asarray(ids, dtype=str),
+                         indptr=indptr, doc_ids=doc_ids, tfs=tfs,
+                         doc_lengths=np.asarray(doc_lengths, dtype=np.float32))
+            with open(meta_tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(postings_tmp, os.path.join(path, POSTINGS_FILE))
+            os.replace(meta_tmp, os.path.join(path, META_FILE))
+        finally:
+            # Temporaries still present here belong to a failed build
+            remove_quietly([p for p in (postings_tmp, meta_tmp) if os.path.exists(p)])
+        print(f"✅ Built lexical index with {len(ids)} documents and {len(vocabulary)} terms "
+              f"in {time.time() - started:.1f}s")
+        return cls(path).load()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, META_FILE))
+
+    def is_current(self, collection_count, collection_writes=None):
+        return (self.meta is not None and self.meta.get("collection_count") == collection_count
+                and self.meta.get("collection_writes") == collection_writes)
+
+    def load(self):
+        with open(os.path.join(self.path, META_FILE)) as f:
+            self.meta = json.load(f)
+        with np.load(os.path.join(self.path, POSTINGS_FILE)) as data:
+            self.vocabulary = {term: i for i, term in enumerate(data["vocabulary"].tolist())}
+            self.ids = data["ids"].tolist()
+            self.indptr = data["indptr"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"]
+            self.doc_lengths = data["doc_lengths"]
+        self._avgdl = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        return self
+
+    def __len__(self):
+        return 0 if self.meta is None else self.meta["count"]
+
+    def _idf(self, df):
+        return np.log(1.0 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=5):
+        """
+        Top-k (chroma_id, score, coverage) for a query, best first. coverage is
+        the share of the query's IDF mass the document matches (0..1), which
+        makes a cutoff meaningful across queries.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not len(self):
+            return []
+        docs, weights, matched = [], [], []
+        total_idf = 0.0
+        for term in terms:
+            row = self.vocabulary.get(term)
+            if row is None:
+                total_idf += self._idf(0)
+                continue
+            start, end = self.indptr[row], self.indptr[row + 1]
+            idf = self._idf(end - start)
+            total_idf += idf
+            tf = self.tfs[start:end]
+            lengths = self.doc_lengths[self.doc_ids[start:end]]
+            docs.append(self.doc_ids[start:end])
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths / self._avgdl)))
+            matched.append(np.full(end - start, idf, dtype=np.float32))
+        if not docs:
+            return []
+        docs = np.concatenate(docs)
+        scores = np.bincount(docs, weights=np.concatenate(weights), minlength=len(self))
+        coverage = np.bincount(docs, weights=np.concatenate(matched), minlength=len(self)) / total_idf
+        candidates = np.unique(docs)
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i]), float(coverage[i])) for i in top]
+
+
+def reciprocal_rank_fusion(rankings, k=5, constant=60):
+    """Fuse several best-first lists of documents with RRF; returns the top-k documents"""
+    fused = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            fused[document] = fused.get(document, 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
+
+
+if __name__ == "__main__":
+    # python -m Question_generation.lexical_index  -> (re)build the BM25 index from Chroma
+    from Question_generation.Retrivel import get_collection, collection_version
+    collection = get_collection()
+    if collection is None:
+        raise SystemExit("⚠️ Collection not available, nothing to index")
+    with build_lock(LEXICAL_INDEX_PATH):
+        BM25Index.build_from_collection(collection, collection_writes=collection_version(collection)[0])
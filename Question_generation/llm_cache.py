@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(24 * 60 * 60)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_DISK_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "20000"))
+LLM_CACHE_PRUNE_EVERY = int(os.environ.get("LLM_CACHE_PRUNE_EVERY", "100"))   # disk writes between size/expiry passes
+
+
+def make_cache_key(model, messages):
+    """
+    Content address for a chat completion: sha256 over the model name and the
+    messages with whitespace normalized, so cosmetic prompt indentation does not
+    produce distinct entries.
+    """
+    normalized = [
+        {"role": m.get("role", ""), "content": " ".join(str(m.get("content", "")).split())}
+        for m in messages
+    ]
+    raw = json.dumps({"model": model, "messages": normalized}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier prompt/response cache: an in-memory LRU in front of a SQLite file.
+
+    Entries expire after `ttl` seconds; the memory tier holds at most
+    `max_memory_entries` and the disk tier at most `max_disk_entries`, evicting
+    the least recently used rows once either bound is exceeded. The disk tier
+    is pruned every `prune_every` writes rather than on each one, so it may
+    briefly hold up to that many extra rows.
+    """
+
+    def __init__(self, db_path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL,
+                 max_memory_entries=LLM_CACHE_MEMORY_ENTRIES, max_disk_entries=LLM_CACHE_DISK_ENTRIES,
+                 prune_every=LLM_CACHE_PRUNE_EVERY):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.prune_every = max(prune_every, 1)
+        self._writes_since_prune = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "memory_evictions": 0, "disk_evictions": 0, "expired": 0}
+        self._conn = None
+        if db_path:
+            try:
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache disk tier disabled ({db_path}): {e}")
+                self._conn = None
+
+    def _expired(self, created_at, now):
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _prune(self, now):
+        """Drop expired rows and trim the disk tier to max_disk_entries (caller holds the lock)"""
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)", (overflow,)
+            )
+            self._stats["disk_evictions"] += overflow
+
+    def get(self, key):
+        """Return the cached completion for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, created_at = row
+                        if not self._expired(created_at, now):
+                            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                            self._conn.commit()
+                            self._remember(key, value, created_at)
+                            self._stats["disk_hits"] += 1
+                            return value
+                        self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self._conn.commit()
+                        self._stats["expired"] += 1
+                except sqlite3.Error as e:
+                    print(f"⚠️ LLM cache read failed: {e}")
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        """Store a successful completion in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["stores"] += 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= self.prune_every:
+                    self._writes_since_prune = 0
+                    self._prune(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters plus current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return stats
@@ -1,8 +1,400 @@
+import os
+import json
+import time
 import threading
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from itertools import cycle
+from concurrent.futures import ThreadPoolExecutor, Future
+from Question_generation.llm_cache import LLMCache, make_cache_key, LLM_CACHE_ENABLED
+from Question_generation.resilience import (
+    LLMError, LLMTimeoutError, CircuitBreaker, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES,
+    parse_retry_after
+)
+
+LLM_API_URL = os.environ.get("LLM_API_URL", "https://router.huggingface.co/nscale/v1/chat/completions")
+LLM_MODEL = os.environ.get("LLM_MODEL", "deepseek-ai/DeepSeek-R1-Distill-Llama-8B")
+LLM_MAX_WORKERS = int(os.environ.get("LLM_MAX_WORKERS", "16"))
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "32"))
+# "async" schedules calls over the key pool on an asyncio loop; "threaded" uses the worker pool
+LLM_TRANSPORT = os.environ.get("LLM_TRANSPORT", "async")
+
+
+def configured_api_keys():
+    """HF_API_KEYS (comma separated) if set, otherwise HF_API_KEY1/HF_API_KEY2"""
+    keys = [k.strip() for k in os.environ.get("HF_API_KEYS", "").split(",") if k.strip()]
+    if not keys:
+        keys = [k for k in (os.environ.get("HF_API_KEY1", ""), os.environ.get("HF_API_KEY2", "")) if k]
+    return list(dict.fromkeys(keys))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key starts the
+    work, callers arriving while it is in flight share its Future (result or
+    exception) instead of issuing their own upstream request.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "collapsed": 0}
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def submit(self, key, start):
+        """Return the in-flight Future for key, or register the one returned by start()"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["collapsed"] += 1
+                return future
+            future = self._calls[key] = start()
+            self._stats["leaders"] += 1
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def do(self, key, fn):
+        """Synchronous variant: run fn() in the calling thread unless an identical call is in flight"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["collapsed"] += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                self._stats["leaders"] += 1
+                leader = True
+
+        if leader:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._forget(key, future)
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+            return stats
+
+
+class LLMClient:
+    """
+    Long-lived LLM client shared by every request in the process.
+
+    Keeps one keep-alive requests.Session per endpoint (so the TCP/TLS
+    handshake to the router is paid once, not per call) and runs calls on a
+    bounded worker pool instead of spawning a thread per query. With the
+    "async" transport, completions are instead scheduled by AsyncLLMClient
+    over the whole key pool (which also hedges stragglers).
+
+    Every call is bounded by LLM_TIMEOUT and guarded by one circuit breaker
+    per endpoint, shared by both transports and the streaming path.
+    """
+
+    def __init__(self, api_url=LLM_API_URL, model=LLM_MODEL, max_workers=LLM_MAX_WORKERS, pool_size=LLM_POOL_SIZE,
+                 cache=None, api_keys=None, transport=LLM_TRANSPORT):
+        self.api_url = api_url
+        self.model = model
+        self.pool_size = pool_size
+        self.cache = cache
+        self.single_flight = SingleFlight()
+        self.breaker = CircuitBreaker(api_url)
+        self.api_keys = [k for k in (api_keys or []) if k]
+        self._key_cycle = cycle(self.api_keys) if self.api_keys else None
+        self.async_client = None
+        if transport == "async":
+            from Question_generation.async_llm import AsyncLLMClient
+            self.async_client = AsyncLLMClient(api_url, model, self.api_keys, pool_size=pool_size,
+                                               breaker=self.breaker)
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def _get_session(self, url):
+        """Return the pooled keep-alive session for an endpoint, creating it on first use"""
+        with self._sessions_lock:
+            http = self._sessions.get(url)
+            if http is None:
+                http = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                http.mount("https://", adapter)
+                http.mount("http://", adapter)
+                self._sessions[url] = http
+            return http
+
+    def _resolve_key(self, api_key):
+        """Callers may pass None to let the client pick a configured key"""
+        if api_key or self._key_cycle is None:
+            return api_key
+        return next(self._key_cycle)
+
+    def _post(self, headers, payload, stream=False, rotate_key=False):
+        """
+        POST through the endpoint's circuit breaker with connect/read timeouts.
+        A 429 counts as a live endpoint, as in the async client, and is retried
+        up to LLM_MAX_RETRIES times: right away on the next configured key when
+        rotate_key is set, otherwise after the response's Retry-After.
+        """
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            try:
+                response = self._get_session(self.api_url).post(
+                    self.api_url, headers=headers, json=payload, stream=stream,
+                    timeout=(LLM_CONNECT_TIMEOUT, LLM_TIMEOUT)
+                )
+            except requests.Timeout as e:
+                self.breaker.record_failure()
+                raise LLMTimeoutError(f"Error: LLM call timed out: {e}") from e
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                raise LLMError(f"Error: {type(e).__name__}: {e}") from e
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if response.status_code == 200:
+                return response
+            if response.status_code == 429 and attempt < LLM_MAX_RETRIES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if rotate_key and len(self.api_keys) > 1:
+                    response.close()
+                    attempt += 1
+                    headers = dict(headers, Authorization=f"Bearer {next(self._key_cycle)}")
+                    continue
+                if retry_after <= LLM_TIMEOUT:
+                    response.close()
+                    attempt += 1
+                    time.sleep(retry_after)
+                    continue
+            raise LLMError(f"Error: {response.status_code}\n{response.text}")
+
+    def _request(self, messages, api_key):
+        """POST a single chat completion; raises LLMError on failure"""
+        rotate_key = not api_key   # only calls that let the client pick a key may switch keys
+        api_key = self._resolve_key(api_key)
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "messages": messages,
+            "model": self.model
+        }
+        response = self._post(headers, payload, rotate_key=rotate_key)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Error: malformed completion response: {e}") from e
+
+    def _fetch(self, key, messages, api_key):
+        content = self._request(messages, api_key)
+        # Only successful completions are cached; errors are retried next time
+        if self.cache is not None:
+            self.cache.set(key, content)
+        return content
+
+    def _start_async(self, key, messages, api_key):
+        future = self.async_client.submit(messages, api_key)
+        if self.cache is not None:
+            def store(f):
+                # Runs on the event loop thread; the SQLite write goes to the worker pool instead
+                if not f.cancelled() and f.exception() is None:
+                    try:
+                        self._executor.submit(self.cache.set, key, f.result())
+                    except RuntimeError:
+                        pass   # client closed; the response just isn't cached
+            future.add_done_callback(store)
+        return future
+
+    def _complete_threaded(self, messages, api_key):
+        key = make_cache_key(self.model, messages)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        # Identical requests already in flight share one upstream call
+        return self.single_flight.do(key, lambda: self._fetch(key, messages, api_key))
+
+    def complete(self, messages, api_key):
+        """Run a single chat completion and return the message content (or an error string)"""
+        try:
+            return self.submit(messages, api_key).result()
+        except Exception as e:
+            return str(e)
+
+    def stream(self, messages, api_key):
+        """
+        Stream a chat completion from the OpenAI-compatible SSE endpoint.
+        Yields content deltas as they arrive; raises LLMError on failure or
+        LLMTimeoutError once the whole stream exceeds LLM_TIMEOUT.
+        A cache hit is replayed as a single delta.
+        """
+        rotate_key = not api_key
+        api_key = self._resolve_key(api_key)
+        key = make_cache_key(self.model, messages) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        payload = {
+            "messages": messages,
+            "model": self.model,
+            "stream": True
+        }
+        deadline = time.monotonic() + LLM_TIMEOUT
+        with self._post(headers, payload, stream=True, rotate_key=rotate_key) as response:
+            parts = []
+            finished = False
+            for line in response.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise LLMTimeoutError(f"Error: LLM stream exceeded the {LLM_TIMEOUT:g}s deadline")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    finished = True
+                    break
+                try:
+                    choices = json.loads(data).get("choices") or [{}]
+                except ValueError:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        # A stream that ended without [DONE] may be truncated, so only complete ones are cached
+        if key is not None and parts and finished:
+            self.cache.set(key, "".join(parts))
+
+    def submit(self, messages, api_key):
+        """Schedule a completion and return its Future; a failed call raises LLMError from result()"""
+        if self.async_client is None:
+            return self._executor.submit(self._complete_threaded, messages, api_key)
+
+        key = make_cache_key(self.model, messages)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                return future
+        # Identical requests already in flight share one upstream call
+        return self.single_flight.submit(key, lambda: self._start_async(key, messages, api_key))
+
+    def stats(self):
+        """Counters for the layers in front of the upstream endpoint"""
+        return {
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "single_flight": self.single_flight.stats(),
+            "transport": self.async_client.stats() if self.async_client is not None else "threaded",
+            "circuit_breaker": self.breaker.stats()
+        }
+
+    def close(self):
+        if self.async_client is not None:
+            self.async_client.close()
+        self._executor.shutdown(wait=False)
+        with self._sessions_lock:
+            for http in self._sessions.values():
+                http.close()
+            self._sessions.clear()
+
+
+class ThinkStripper:
+    """
+    Incremental version of remove_first_think for streamed output.
+
+    feed() returns the text that is safe to show so far: the first
+    <think>...</think> block is held back and dropped once closed, and a
+    partially received "<think>" tag is buffered until it can be decided.
+    If the block never closes the held text is released by flush(), which
+    matches the regex leaving an unterminated block untouched.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.state = "before"
+        self.buffer = ""
+        self.started = False
+
+    def _emit(self, text):
+        # Mirror the .strip() applied to full completions: drop leading whitespace
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
+
+    def feed(self, chunk):
+        if self.state == "done":
+            return self._emit(chunk)
+
+        self.buffer += chunk
+        if self.state == "before":
+            idx = self.buffer.find(self.OPEN_TAG)
+            if idx == -1:
+                # Hold back any suffix that could still grow into the opening tag
+                keep = 0
+                for size in range(min(len(self.OPEN_TAG) - 1, len(self.buffer)), 0, -1):
+                    if self.OPEN_TAG.startswith(self.buffer[-size:]):
+                        keep = size
+                        break
+                visible = self.buffer[:len(self.buffer) - keep]
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                return self._emit(visible)
+            visible = self.buffer[:idx]
+            self.buffer = self.buffer[idx:]
+            self.state = "inside"
+            return self._emit(visible) + self.feed("")
+
+        end = self.buffer.find(self.CLOSE_TAG)
+        if end == -1:
+            return ""
+        rest = self.buffer[end + len(self.CLOSE_TAG):]
+        self.buffer = ""
+        self.state = "done"
+        return self._emit(rest)
+
+    def flush(self):
+        """Release whatever is still held back once the stream has ended"""
+        remaining, self.buffer = self.buffer, ""
+        self.state = "done"
+        return self._emit(remaining)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide LLM client, creating it lazily"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(cache=LLMCache() if LLM_CACHE_ENABLED else None, api_keys=configured_api_keys())
+        return _client
+
 
 class LLMThread(threading.Thread):
+    """Kept for backwards compatibility; runs a single query through the shared client."""
+
     def __init__(self, messages, api_key):
         threading.Thread.__init__(self)
         self.messages = messages
@@ -12,45 +404,30 @@ class LLMThread(threading.Thread):
 
     def run(self):
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "messages": self.messages,
-                "model": "deepseek-ai/DeepSeek-R1-Distill-Llama-8B"
-            }
-            response = requests.post(
-                "https://router.huggingface.co/nscale/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            if response.status_code == 200:
-                self.result = response.json()["choices"][0]["message"]["content"]
-            else:
-                self.error = f"Error: {response.status_code}\n{response.text}"
+            self.result = get_llm_client().complete(self.messages, self.api_key)
         except Exception as e:
             self.error = str(e)
 
-def parallel_llm_queries(tasks):
+def parallel_llm_queries(tasks, return_exceptions=False):
     """
     Run multiple LLM queries in parallel
-    
-    tasks: list of tuples (messages, api_key)
-    returns: list of results in the same order as tasks
+
+    tasks: list of tuples (messages, api_key); with the async transport a key
+           from the configured pool is only a hint and api_key may be None
+    returns: list of results in the same order as tasks; a failed query yields
+             its error message, or the LLMError itself if return_exceptions is set
     """
-    threads = []
-    for messages, api_key in tasks:
-        thread = LLMThread(messages, api_key)
-        threads.append(thread)
-        thread.start()
+    client = get_llm_client()
+    futures = [client.submit(messages, api_key) for messages, api_key in tasks]
 
     results = []
-    for thread in threads:
-        thread.join()
-        if thread.error:
-            results.append(thread.error)
-        else:
-            results.append(thread.result)
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if return_exceptions:
+                results.append(e if isinstance(e, LLMError) else LLMError(str(e)))
+            else:
+                results.append(str(e))
 
     return results
@@ -1,31 +1,336 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, Text, DateTime
+from sqlalchemy import (
+    create_engine, event, inspect, text, bindparam, case, func, literal, update, delete,
+    Column, Index, Integer, Float, String, Text, Date, DateTime, Boolean
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, validates, column_property
 import datetime
 import os
 
 Base = declarative_base()
 
+DEFAULT_SESSION_ID = "default"  # requests without a session id share this session
+
 class InterviewQA(Base):
     __tablename__ = 'interview_qa'
 
+    # Columns feeding the performance aggregates use active_history, so the old value is loaded before
+    # assignment and a re-scored row can subtract its previous bucket even when the attribute was expired
     id = Column(Integer, primary_key=True)
-    user_id = Column(String(50), default="guest", nullable=False)
+    user_id = column_property(Column(String(50), default="guest", nullable=False), active_history=True)
+    session_id = Column(String(64), default=DEFAULT_SESSION_ID, nullable=True)  # Interview session the question belongs to
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=True)  # Answer can be null initially
-    difficulty = Column(String(20), nullable=False)
-    score = Column(Float, default=0.0, nullable=False)
+    difficulty = column_property(Column(String(20), nullable=False), active_history=True)
+    score = column_property(Column(Float, default=0.0, nullable=False), active_history=True)
     feedback = Column(Text, nullable=True)  # Feedback is optional
     timestamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
-    confidence_score = Column(Float, default=0.0, nullable=True)  # Speech confidence score
+    confidence_score = column_property(Column(Float, default=0.0, nullable=True), active_history=True)  # Speech confidence score
     confidence_feedback = Column(Text, nullable=True)  # Speech confidence feedback
+    is_pending = Column(Boolean, default=True, nullable=False)  # True until the question is answered
+    scored_at = column_property(Column(DateTime, nullable=True), active_history=True)  # Set when an evaluation scores the answer
+    archived_at = Column(DateTime, nullable=True)  # Set when the session ends; archived rows leave the hot paths
+
+    __table_args__ = (
+        Index("ix_interview_qa_user_id_id", "user_id", "id"),
+        Index("ix_interview_qa_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_interview_qa_user_id_pending", "user_id", "is_pending", "id"),
+        Index("ix_interview_qa_session_id_id", "session_id", "id"),
+        Index("ix_interview_qa_session_id_pending", "session_id", "is_pending", "id"),
+        Index("ix_interview_qa_session_id_archived", "session_id", "archived_at", "id"),
+    )
+
+    @validates("answer")
+    def _sync_pending(self, key, answer):
+        # Keep the pending flag in step with every assignment to answer
+        self.is_pending = not answer
+        return answer
+
+
+class PerformanceAggregate(Base):
+    """
+    Running statistics of scored answers per user x day x difficulty, kept
+    current on every flush that scores or re-scores a row. Means and M2 (sum of
+    squared deviations) follow Welford's method, so variance = m2 / (count - 1).
+    """
+    __tablename__ = 'performance_aggregates'
+
+    user_id = Column(String(50), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day the answer was scored
+    difficulty = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    score_mean = Column(Float, default=0.0, nullable=False)
+    score_m2 = Column(Float, default=0.0, nullable=False)
+    confidence_mean = Column(Float, default=0.0, nullable=False)
+    confidence_m2 = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
 
 # SQLite database file
-db_path = 'interview.db'
-engine = create_engine(f'sqlite:///{db_path}', connect_args={'check_same_thread': False})
+db_path = os.environ.get("INTERVIEW_DB_PATH", 'interview.db')
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))          # pooled connections, roughly one per serving thread
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))   # wait this long for the writer lock
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")        # NORMAL is durable enough under WAL
+
+# Connections are handed between threads by the pool, never shared by two at once
+engine = create_engine(
+    f'sqlite:///{db_path}',
+    connect_args={'check_same_thread': False, 'timeout': DB_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a write is in progress
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _welford_add(mean, m2, count, value):
+    """SET expressions adding value to a running (mean, m2) over count previous values"""
+    return {
+        mean.name: mean + (value - mean) / (count + 1),
+        m2.name: m2 + (value - mean) * (value - mean) * count / (count + 1)
+    }
 
-# Create tables if they don't exist
+
+def _welford_remove(mean, m2, count, value):
+    """SET expressions removing value from a running (mean, m2) over count values"""
+    return {
+        mean.name: case((count > 1, mean - (value - mean) / (count - 1)), else_=0.0),
+        m2.name: case((count > 1, func.max(m2 - (value - mean) * (value - mean) * count / (count - 1), 0.0)), else_=0.0)
+    }
+
+
+def apply_aggregate_delta(conn, sign, user_id, day, difficulty, score, confidence):
+    """
+    Add (sign=1) or remove (sign=-1) one scored answer from its aggregate
+    bucket. Each change is a single statement whose SET expressions all see the
+    bucket's old values, so concurrent writers never lose an update. A bucket
+    whose last answer is removed is deleted, as rebuild_aggregates() would.
+    """
+    table = PerformanceAggregate.__table__
+    now = datetime.datetime.utcnow()
+    if sign > 0:
+        statement = sqlite_insert(table).values(
+            user_id=user_id, day=day, difficulty=difficulty, count=1, score_mean=score, score_m2=0.0,
+            confidence_mean=confidence, confidence_m2=0.0, updated_at=now
+        )
+        changes = {"count": table.c.count + 1, "updated_at": now}
+        changes.update(_welford_add(table.c.score_mean, table.c.score_m2, table.c.count, statement.excluded.score_mean))
+        changes.update(_welford_add(table.c.confidence_mean, table.c.confidence_m2, table.c.count,
+                                    statement.excluded.confidence_mean))
+        conn.execute(statement.on_conflict_do_update(index_elements=["user_id", "day", "difficulty"], set_=changes))
+    else:
+        changes = {"count": table.c.count - 1, "updated_at": now}
+        changes.update(_welford_remove(table.c.score_mean, table.c.score_m2, table.c.count, literal(score)))
+        changes.update(_welford_remove(table.c.confidence_mean, table.c.confidence_m2, table.c.count, literal(confidence)))
+        bucket = (table.c.user_id == user_id, table.c.day == day, table.c.difficulty == difficulty)
+        conn.execute(update(table).where(*bucket, table.c.count > 0).values(changes))
+        conn.execute(delete(table).where(*bucket, table.c.count <= 0))
+
+
+def backfill_scored_at(conn):
+    """Mark answers that carry an evaluation but no scored_at as scored when they were asked"""
+    conn.execute(text(
+        "UPDATE interview_qa SET scored_at = timestamp WHERE scored_at IS NULL AND is_pending = 0 "
+        "AND feedback IS NOT NULL AND feedback NOT LIKE 'Evaluation unavailable%'"
+    ))
+
+
+def rebuild_aggregates(conn):
+    """Recompute every aggregate bucket from the scored rows, inside the caller's transaction"""
+    conn.execute(text("DELETE FROM performance_aggregates"))
+    conn.execute(text("""
+        INSERT INTO performance_aggregates (user_id, day, difficulty, count, score_mean, score_m2,
+                                            confidence_mean, confidence_m2, updated_at)
+        SELECT user_id, date(scored_at), difficulty, COUNT(*),
+               AVG(score), max(SUM(score * score) - COUNT(*) * AVG(score) * AVG(score), 0),
+               AVG(COALESCE(confidence_score, 0)),
+               max(SUM(COALESCE(confidence_score, 0) * COALESCE(confidence_score, 0))
+                   - COUNT(*) * AVG(COALESCE(confidence_score, 0)) * AVG(COALESCE(confidence_score, 0)), 0),
+               :now
+        FROM interview_qa WHERE scored_at IS NOT NULL
+        GROUP BY user_id, date(scored_at), difficulty
+    """).bindparams(bindparam("now", type_=DateTime)), {"now": datetime.datetime.utcnow()})
+
+
+def migrate(bind=engine):
+    """Bring an existing database up to the current schema; safe to run repeatedly"""
+    with bind.begin() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("interview_qa")}
+        if "is_pending" not in columns:
+            conn.execute(text("ALTER TABLE interview_qa ADD COLUMN is_pending BOOLEAN NOT NULL DEFAULT 0"))
+            conn.execute(text("UPDATE interview_qa SET is_pending = (answer IS NULL OR answer = '')"))
+        if "session_id" not in columns:
+            conn.execute(text("ALTER TABLE interview_qa ADD COLUMN session_id VARCHAR(64)"))
+        if "scored_at" not in columns:
+            conn.execute(text("ALTER TABLE interview_qa ADD COLUMN scored_at DATETIME"))
+            # Answers evaluated before scored_at existed count as scored when they were asked
+            backfill_scored_at(conn)
+            rebuild_aggregates(conn)
+        if "archived_at" not in columns:
+            conn.execute(text("ALTER TABLE interview_qa ADD COLUMN archived_at DATETIME"))
+        # Rows written before sessions existed belong to the default session
+        conn.execute(text("UPDATE interview_qa SET session_id = :default WHERE session_id IS NULL"),
+                     {"default": DEFAULT_SESSION_ID})
+        for index in InterviewQA.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Create tables if they don't exist, then add columns/indexes introduced since
 Base.metadata.create_all(engine)
+migrate()
 
 Session = sessionmaker(bind=engine)
-session = Session()
+# Thread-local session proxy: each request thread gets its own session, removed on request teardown
+session = scoped_session(Session)
+
+
+def _aggregate_contribution(row, before):
+    """(user_id, day, difficulty, score, confidence) a row adds to the aggregates, before or after this flush"""
+    if before:
+        state = inspect(row)
+        if state.pending:
+            return None
+        values = {}
+        for name in ("user_id", "difficulty", "score", "confidence_score", "scored_at"):
+            history = state.attrs[name].load_history()
+            values[name] = (history.deleted or history.unchanged or [None])[0]
+    else:
+        values = {name: getattr(row, name) for name in ("user_id", "difficulty", "score", "confidence_score", "scored_at")}
+    if values["scored_at"] is None:
+        return None
+    return (values["user_id"] or "guest", values["scored_at"].date(), values["difficulty"],
+            float(values["score"] or 0.0), float(values["confidence_score"] or 0.0))
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_aggregate_deltas(db, flush_context, instances):
+    # Compare each scored row before and after the flush; history is read here, the SQL runs after the flush
+    deltas = db.info.setdefault("aggregate_deltas", [])
+    for row in list(db.new) + list(db.dirty):
+        if not isinstance(row, InterviewQA) or not db.is_modified(row):
+            continue
+        old, new = _aggregate_contribution(row, True), _aggregate_contribution(row, False)
+        if old != new:
+            if old:
+                deltas.append((-1,) + old)
+            if new:
+                deltas.append((1,) + new)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_aggregate_deltas(db, flush_context):
+    deltas = db.info.pop("aggregate_deltas", None)
+    if deltas:
+        conn = db.connection()
+        for delta in deltas:
+            apply_aggregate_delta(conn, *delta)
+
+
+# Query helpers for the hot paths; each one is served by an index above
+
+def latest_question(db, session_id=DEFAULT_SESSION_ID):
+    """Most recent active question in a session (ix_interview_qa_session_id_archived)"""
+    return db.query(InterviewQA) \
+        .filter(InterviewQA.session_id == session_id, InterviewQA.archived_at.is_(None)) \
+        .order_by(InterviewQA.id.desc()).first()
+
+
+def latest_pending_question(db, session_id=DEFAULT_SESSION_ID):
+    """Most recent unanswered question in a session (ix_interview_qa_session_id_pending)"""
+    return db.query(InterviewQA) \
+        .filter(InterviewQA.session_id == session_id, InterviewQA.is_pending.is_(True), InterviewQA.archived_at.is_(None)) \
+        .order_by(InterviewQA.id.desc()).first()
+
+
+def interview_history(db, session_id=DEFAULT_SESSION_ID):
+    """The active interview's questions in time order (ix_interview_qa_session_id_archived)"""
+    return db.query(InterviewQA) \
+        .filter(InterviewQA.session_id == session_id, InterviewQA.archived_at.is_(None)) \
+        .order_by(InterviewQA.timestamp)
+
+
+def archive_session(db, session_id, archived_at=None):
+    """Move a session's active rows out of the hot paths without deleting them; returns the row count"""
+    return db.query(InterviewQA) \
+        .filter(InterviewQA.session_id == session_id, InterviewQA.archived_at.is_(None)) \
+        .update({InterviewQA.archived_at: archived_at or datetime.datetime.utcnow()}, synchronize_session=False)
+
+
+FEEDBACK_COLUMNS = (
+    InterviewQA.id, InterviewQA.question, InterviewQA.answer, InterviewQA.difficulty, InterviewQA.score,
+    InterviewQA.feedback, InterviewQA.timestamp, InterviewQA.confidence_score, InterviewQA.confidence_feedback
+)
+
+
+def feedback_rows(db, user_id=None, session_id=None, difficulty=None, after_id=0, limit=None,
+                  include_archived=False):
+    """
+    Answered rows as plain column tuples (FEEDBACK_COLUMNS) with id > after_id,
+    in id order; a keyset page when limit is given. session_id and user_id
+    filters combine; with neither, the guest user's rows are returned.
+    Archived interviews are left out unless include_archived is set.
+    """
+    query = db.query(*FEEDBACK_COLUMNS).filter(InterviewQA.is_pending.is_(False), InterviewQA.id > after_id)
+    if not include_archived:
+        query = query.filter(InterviewQA.archived_at.is_(None))
+    if session_id:
+        query = query.filter(InterviewQA.session_id == session_id)
+    if user_id or not session_id:
+        query = query.filter(InterviewQA.user_id == (user_id or "guest"))
+    if difficulty:
+        query = query.filter(InterviewQA.difficulty == difficulty)
+    query = query.order_by(InterviewQA.id)
+    return query.limit(limit) if limit else query
+
+
+def _merge_stats(a, b):
+    """Combine two (count, mean, m2) summaries (Chan et al. parallel variance)"""
+    count = a[0] + b[0]
+    if not count:
+        return 0, 0.0, 0.0
+    delta = b[1] - a[1]
+    return count, a[1] + delta * b[0] / count, a[2] + b[2] + delta * delta * a[0] * b[0] / count
+
+
+def _describe(count, score, confidence):
+    return {
+        "count": count,
+        "score_mean": round(score[1], 3),
+        "score_std": round((score[2] / (count - 1)) ** 0.5, 3) if count > 1 else 0.0,
+        "confidence_mean": round(confidence[1], 3),
+        "confidence_std": round((confidence[2] / (count - 1)) ** 0.5, 3) if count > 1 else 0.0
+    }
+
+
+def performance_summary(db, user_id="guest", since=None):
+    """
+    Per-day and per-difficulty score/confidence statistics for a user, read
+    from the aggregates table: the cost depends on days x difficulties, never
+    on the number of stored answers.
+    """
+    query = db.query(PerformanceAggregate).filter(PerformanceAggregate.user_id == user_id,
+                                                  PerformanceAggregate.count > 0)
+    if since:
+        query = query.filter(PerformanceAggregate.day >= since)
+    days, totals = [], {}
+    for bucket in query.order_by(PerformanceAggregate.day, PerformanceAggregate.difficulty):
+        score = (bucket.count, bucket.score_mean, bucket.score_m2)
+        confidence = (bucket.count, bucket.confidence_mean, bucket.confidence_m2)
+        days.append(dict(day=bucket.day.isoformat(), difficulty=bucket.difficulty,
+                         **_describe(bucket.count, score, confidence)))
+        total = totals.get(bucket.difficulty, ((0, 0.0, 0.0), (0, 0.0, 0.0)))
+        totals[bucket.difficulty] = (_merge_stats(total[0], score), _merge_stats(total[1], confidence))
+    return {
+        "days": days,
+        "totals": {difficulty: _describe(score[0], score, confidence) for difficulty, (score, confidence) in totals.items()}
+    }
@@ -0,0 +1,84 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Question_generation.llm_utils import get_llm_client
+
+PREFETCH_QUESTIONS = os.environ.get("PREFETCH_QUESTIONS", "0") == "1"
+PREFETCH_LAUNCH_WORKERS = int(os.environ.get("PREFETCH_LAUNCH_WORKERS", "4"))
+
+# One bounded launcher shared by every session's prefetcher; its threads only build prompts
+# and submit them to the LLM client, which runs the calls themselves
+_launcher = ThreadPoolExecutor(max_workers=PREFETCH_LAUNCH_WORKERS, thread_name_prefix="prefetch")
+
+
+class QuestionPrefetcher:
+    """
+    Speculative next-question generation.
+
+    As soon as a question is served, start() launches one generic follow-up per
+    plausible next difficulty in the background. When the answer arrives and
+    the evaluation has settled the difficulty, take() serves the matching
+    candidate and drops the others, so the turn only waits for evaluation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._candidates = {}
+        self._stats = {"started": 0, "served": 0, "misses": 0, "discarded": 0}
+
+    def _launch(self, build_messages, difficulty, api_key):
+        # Building the prompt involves retrieval, so it also runs off the request thread
+        return get_llm_client().submit(build_messages(difficulty), api_key)
+
+    def start(self, difficulties, build_messages, api_key=None):
+        """Discard any previous candidates and speculatively generate one per difficulty"""
+        self.discard()
+        with self._lock:
+            for difficulty in dict.fromkeys(difficulties):
+                self._candidates[difficulty] = _launcher.submit(self._launch, build_messages, difficulty, api_key)
+                self._stats["started"] += 1
+
+    def has_candidates(self):
+        with self._lock:
+            return bool(self._candidates)
+
+    def discard(self):
+        """
+        Drop all outstanding candidates. Launches that haven't started are
+        cancelled; submitted LLM calls are only dropped, never cancelled,
+        because SingleFlight may share the same future with another session.
+        """
+        with self._lock:
+            candidates, self._candidates = self._candidates, {}
+            self._stats["discarded"] += len(candidates)
+        for launch in candidates.values():
+            launch.cancel()
+
+    def take(self, difficulty):
+        """
+        Return the raw completion prefetched for difficulty (waiting for it if it is
+        still running) or None if there is none or it failed; the rest are discarded.
+        """
+        with self._lock:
+            launch = self._candidates.pop(difficulty, None)
+            if launch is None:
+                self._stats["misses"] += 1
+        self.discard()
+        if launch is None:
+            return None
+        try:
+            result = launch.result().result()
+        except Exception as e:
+            print(f"⚠️ Prefetched {difficulty} question failed: {e}")
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["served"] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._candidates)
+            return stats
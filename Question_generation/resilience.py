@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from collections import deque
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "90"))                     # per-call deadline in seconds
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))     # consecutive failures before opening
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))        # seconds before a trial call is let through
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))                # retries of a rate-limited (429) call
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_retry_after(value):
+    """Retry-After is either delta-seconds or an HTTP date"""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class LLMError(RuntimeError):
+    """An LLM call failed (non-200 response, transport error, ...)"""
+
+
+class LLMTimeoutError(LLMError):
+    """An LLM call exceeded its deadline"""
+
+
+class CircuitOpenError(LLMError):
+    """The endpoint is marked unhealthy; the call was rejected without being sent"""
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    closed    -> calls flow; `failure_threshold` consecutive failures open it
+    open      -> calls fail fast with CircuitOpenError for `reset_timeout` seconds
+    half-open -> one trial call is let through; success closes, failure reopens
+    """
+
+    def __init__(self, name, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may be sent now"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Error: circuit open for {self.name}")
+                self.state = "half-open"
+                self._trial_in_flight = False
+            if self.state == "half-open":
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Error: circuit half-open for {self.name}, trial call in progress")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def abandon(self):
+        """A call was cancelled before it produced an outcome (e.g. a losing hedge)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚠️ Circuit opened for {self.name} after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to pick the hedging delay"""
+
+    def __init__(self, window=200, min_samples=20, percentile=0.95):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def quantile(self):
+        """The tracked percentile, or None until enough samples were seen"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * self.percentile), len(ordered) - 1)]
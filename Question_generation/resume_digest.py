@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from Question_generation.llm_utils import get_llm_client
+from Question_generation.content_ids import content_id
+
+RESUME_TOKEN_BUDGET = int(os.environ.get("RESUME_TOKEN_BUDGET", "800"))
+RESUME_DIGEST_WAIT = float(os.environ.get("RESUME_DIGEST_WAIT", "30"))   # max seconds a turn waits for the digest
+RESUME_DIGEST_ENTRIES = int(os.environ.get("RESUME_DIGEST_ENTRIES", "256"))
+RESUME_DIGEST_RETRY_AFTER = float(os.environ.get("RESUME_DIGEST_RETRY_AFTER", "300"))  # seconds a failed digest isn't retried
+
+DIGEST_PROMPT = """Summarize the resume below into a compact JSON profile for an interviewer.
+Use exactly these keys:
+{"name": str, "headline": str, "skills": [str], "roles": [{"title": str, "company": str, "period": str}],
+ "projects": [{"name": str, "summary": str}], "education": [str], "certifications": [str]}
+Keep every string short. Output only the JSON object.
+
+Resume:
+"""
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer): ~4 characters or ~0.75 words per token, whichever is larger"""
+    if not text:
+        return 0
+    return int(max(len(text) / 4, len(text.split()) * 1.3))
+
+
+def format_profile(profile):
+    """Render the structured profile as compact prompt text"""
+    lines = []
+    if profile.get("name"):
+        lines.append(f"Name: {profile['name']}")
+    if profile.get("headline"):
+        lines.append(f"Summary: {profile['headline']}")
+    if profile.get("skills"):
+        lines.append("Skills: " + ", ".join(str(s) for s in profile["skills"]))
+    for role in profile.get("roles") or []:
+        if isinstance(role, dict):
+            parts = [role.get("title"), role.get("company"), role.get("period")]
+            lines.append("Role: " + " | ".join(str(p) for p in parts if p))
+        else:
+            lines.append(f"Role: {role}")
+    for project in profile.get("projects") or []:
+        if isinstance(project, dict):
+            lines.append(f"Project: {project.get('name', '')} - {project.get('summary', '')}".rstrip(" -"))
+        else:
+            lines.append(f"Project: {project}")
+    if profile.get("education"):
+        lines.append("Education: " + "; ".join(str(e) for e in profile["education"]))
+    if profile.get("certifications"):
+        lines.append("Certifications: " + "; ".join(str(c) for c in profile["certifications"]))
+    return "\n".join(lines)
+
+
+def parse_profile(completion):
+    """Extract the JSON profile from a (possibly reasoning-prefixed) completion"""
+    text = re.sub(r'<think>.*?</think>', '', completion, count=1, flags=re.DOTALL)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("no JSON object in digest response")
+    profile = json.loads(text[start:end + 1])
+    if not isinstance(profile, dict):
+        raise ValueError("digest response is not a JSON object")
+    return profile
+
+
+def truncate_to_budget(text, budget):
+    """Fallback compaction: collapse whitespace and cut to roughly `budget` tokens"""
+    collapsed = " ".join(text.split())
+    return collapsed[:budget * 4]
+
+
+class ResumeDigestCache:
+    """
+    One-time resume digestion, cached by resume content hash.
+
+    submit() starts an LLM call that condenses the raw PDF text into a short
+    structured profile; for_prompt() returns the raw text while it fits the
+    token budget and the compact profile once it does not. A failed digest
+    is remembered for retry_after seconds, during which the truncated resume
+    is used without calling the LLM again.
+    """
+
+    def __init__(self, budget=RESUME_TOKEN_BUDGET, max_entries=RESUME_DIGEST_ENTRIES,
+                 retry_after=RESUME_DIGEST_RETRY_AFTER):
+        self.budget = budget
+        self.max_entries = max_entries
+        self.retry_after = retry_after
+        self._digests = OrderedDict()
+        self._failed = OrderedDict()   # content id -> time of the last failed digest
+        self._lock = threading.RLock()
+
+    def _record_failure(self, key, future):
+        with self._lock:
+            if self._digests.get(key) is future:
+                del self._digests[key]
+            self._failed[key] = time.time()
+            self._failed.move_to_end(key)
+            while len(self._failed) > self.max_entries:
+                self._failed.popitem(last=False)
+
+    def _cooling_down(self, key):
+        """True while a recent failure for this resume should not be retried"""
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if failed_at is None:
+                return False
+            if time.time() - failed_at < self.retry_after:
+                return True
+            del self._failed[key]
+            return False
+
+    def _digest(self, key, resume_text, api_key):
+        messages = [
+            {"role": "system", "content": "You extract structured candidate profiles from resumes. Output only JSON."},
+            {"role": "user", "content": DIGEST_PROMPT + resume_text}
+        ]
+        future = get_llm_client().submit(messages, api_key)
+        profile_future = Future()
+
+        def done(f):
+            try:
+                profile_future.set_result(format_profile(parse_profile(f.result())))
+            except Exception as e:
+                print(f"⚠️ Resume digest failed ({e}), using truncated resume text for {self.retry_after:.0f}s")
+                self._record_failure(key, profile_future)
+                profile_future.set_exception(e)
+        future.add_done_callback(done)
+        return profile_future
+
+    def submit(self, resume_text, api_key=None):
+        """Start digesting a resume unless it is short enough to send raw, already known or recently failed"""
+        if not resume_text or estimate_tokens(resume_text) <= self.budget:
+            return
+        key = content_id(resume_text)
+        with self._lock:
+            if key in self._digests:
+                self._digests.move_to_end(key)
+                return
+            if self._cooling_down(key):
+                return
+            future = self._digest(key, resume_text, api_key)
+            if future.done() and future.exception() is not None:
+                return   # failed synchronously and was already recorded
+            self._digests[key] = future
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+
+    def for_prompt(self, resume_text, api_key=None, wait=RESUME_DIGEST_WAIT):
+        """
+        Resume text to embed in prompts: raw if within budget, else the cached
+        compact profile. Waits up to `wait` seconds for a digest in progress;
+        wait=0 never blocks.
+        """
+        if not resume_text or estimate_tokens(resume_text) <= self.budget:
+            return resume_text
+        key = content_id(resume_text)
+        self.submit(resume_text, api_key)
+        with self._lock:
+            future = self._digests.get(key)
+        if future is None:
+            return truncate_to_budget(resume_text, self.budget)
+        try:
+            compact = future.result(timeout=wait)
+        except FutureTimeoutError:
+            if wait:
+                print("⚠️ Resume digest not ready yet, using truncated resume text")
+            return truncate_to_budget(resume_text, self.budget)
+        except Exception:
+            # Already reported and recorded by the digest callback
+            return truncate_to_budget(resume_text, self.budget)
+        if not compact or estimate_tokens(compact) >= estimate_tokens(resume_text):
+            return resume_text
+        return compact
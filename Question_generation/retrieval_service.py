@@ -0,0 +1,208 @@
+"""
+Shared retrieval service for multi-worker deployments.
+
+One process owns the encoder, the Chroma client and the indexes, and serves
+retrieval to every app worker over a Unix socket. Requests arriving within a
+few milliseconds of each other are micro-batched into a single
+retrieve_many() call, so concurrent workers share one encode and one vector
+query. Workers opt in by setting RETRIEVAL_SERVICE_SOCKET; retrieval then goes
+through RetrievalServiceClient and the model is never loaded in the worker.
+
+    python -m Question_generation.retrieval_service --socket /tmp/retrieval.sock
+
+The wire format is one JSON object per line in each direction.
+"""
+import os
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+
+RETRIEVAL_SERVICE_TIMEOUT = float(os.environ.get("RETRIEVAL_SERVICE_TIMEOUT", "30"))
+RETRIEVAL_BATCH_MAX = int(os.environ.get("RETRIEVAL_BATCH_MAX", "64"))   # queries per micro-batch
+RETRIEVAL_BATCH_WAIT_MS = float(os.environ.get("RETRIEVAL_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Collects retrieval requests for up to max_wait seconds and runs them as one retrieve_many call per k"""
+
+    def __init__(self, retrieve_many, max_batch=RETRIEVAL_BATCH_MAX, max_wait=RETRIEVAL_BATCH_WAIT_MS / 1000):
+        self.retrieve_many = retrieve_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "queries": 0, "batches": 0, "largest_batch": 0}
+        threading.Thread(target=self._run, name="retrieval-batcher", daemon=True).start()
+
+    def submit(self, queries, k):
+        future = Future()
+        self._queue.put((list(queries), k, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            by_k = {}
+            for item in batch:
+                by_k.setdefault(item[1], []).append(item)
+            for k, items in by_k.items():
+                flat = [query for queries, _, _ in items for query in queries]
+                try:
+                    results = self.retrieve_many(flat, k)
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                position = 0
+                for queries, _, future in items:
+                    future.set_result(results[position:position + len(queries)])
+                    position += len(queries)
+                with self._lock:
+                    self._stats["batches"] += 1
+                    self._stats["largest_batch"] = max(self._stats["largest_batch"], len(flat))
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["queries"] += sum(len(queries) for queries, _, _ in batch)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get("op")
+                if op == "retrieve":
+                    future = self.server.batcher.submit(request["queries"], int(request.get("k", 5)))
+                    response = {"results": future.result(timeout=RETRIEVAL_SERVICE_TIMEOUT)}
+                elif op == "ping":
+                    response = {"readiness": self.server.readiness()}
+                elif op == "stats":
+                    response = {"batcher": self.server.batcher.stats(), "cache": self.server.cache_stats()}
+                else:
+                    response = {"error": f"unknown op {op!r}"}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class RetrievalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128   # every app worker thread may connect at once
+
+    def __init__(self, socket_path):
+        import Question_generation.Retrivel as retriever
+        # This process is the service: retrieval must run locally, not loop back over the socket
+        retriever.RETRIEVAL_SERVICE_SOCKET = None
+        self.batcher = MicroBatcher(retriever.retrieve_many)
+        self.readiness = retriever.readiness
+        self.cache_stats = retriever.retrieval_cache_stats
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _Handler)
+
+
+class RetrievalServiceClient:
+    """Thin client with one persistent connection per thread"""
+
+    def __init__(self, socket_path, timeout=RETRIEVAL_SERVICE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            connection = self._local.connection = (sock, sock.makefile("rwb"))
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def call(self, request):
+        """
+        Send one request; a broken connection (e.g. service restart) is
+        re-opened once. A timeout is raised as is: the service may still be
+        working on the request, so resending it would only pile up load.
+        """
+        for attempt in range(2):
+            try:
+                _, stream = self._connection()
+                stream.write(json.dumps(request).encode("utf-8") + b"\n")
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("retrieval service closed the connection")
+                break
+            except socket.timeout:
+                # The reply may still arrive on this connection, so it can't be reused
+                self._close()
+                raise
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def retrieve_many(self, queries, k=5):
+        return self.call({"op": "retrieve", "queries": list(queries), "k": k})["results"]
+
+    def ping(self):
+        return self.call({"op": "ping"})["readiness"]
+
+    def stats(self):
+        return self.call({"op": "stats"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve retrieval to app workers over a Unix socket")
+    parser.add_argument("--socket", default=os.environ.get("RETRIEVAL_SERVICE_SOCKET", "/tmp/retrieval.sock"))
+    args = parser.parse_args()
+
+    server = RetrievalServer(args.socket)
+    from Question_generation.Retrivel import warm_up
+    warm_up()
+    print(f"✅ Retrieval service listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
@@ -0,0 +1,244 @@
+import os
+import json
+import mmap
+import time
+import numpy as np
+from Question_generation.index_files import build_lock, temp_path, remove_quietly
+
+VECTOR_INDEX_PATH = os.environ.get("VECTOR_INDEX_PATH", "./vector_index")
+VECTOR_INDEX_DTYPE = os.environ.get("VECTOR_INDEX_DTYPE", "float32")   # float32 or float16
+# Compact codes for the coarse pass: none, int8 (per-vector scale) or float16
+VECTOR_INDEX_CODES = os.environ.get("VECTOR_INDEX_CODES", "none")
+VECTOR_INDEX_OVERSAMPLE = int(os.environ.get("VECTOR_INDEX_OVERSAMPLE", "8"))   # candidates re-ranked per result
+VECTOR_INDEX_BLOCK_ROWS = 65536   # rows decoded at a time during the coarse pass
+
+EMBEDDINGS_FILE = "embeddings.npy"
+OFFSETS_FILE = "offsets.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+CODES_FILE = "codes.npy"
+SCALES_FILE = "scales.npy"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors):
+    """Symmetric per-vector int8 codes: vectors ~= codes * scales[:, None]"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class NumpyVectorIndex:
+    """
+    In-process exact vector index over a snapshot of a Chroma collection.
+
+    Embeddings are stored L2-normalized in a .npy file that is opened with
+    mmap_mode="r", so every worker process shares the same page-cache pages
+    instead of holding its own copy. Search is one matrix-vector product
+    followed by argpartition for the top-k. Documents live in a JSONL file,
+    also memory-mapped, addressed through an offsets array.
+
+    With compact codes (int8 with a per-vector scale, or float16) the full
+    scan runs over the codes only, block by block, and the best
+    k * oversample candidates are re-ranked exactly against the full-precision
+    rows, so only those rows of the large matrix are ever paged in.
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH):
+        self.path = path
+        self.meta = None
+        self.embeddings = None
+        self.codes = None
+        self.scales = None
+        self.offsets = None
+        self._documents = None
+
+    @classmethod
+    def build_from_collection(cls, collection, path=VECTOR_INDEX_PATH, dtype=VECTOR_INDEX_DTYPE,
+                              codes=VECTOR_INDEX_CODES, batch_size=1000, collection_writes=None):
+        """
+        Snapshot a Chroma collection into the index files, page by page. Callers
+        hold build_lock(path); every file is written under a unique temporary
+        name and only replaced into place once complete.
+        """
+        os.makedirs(path, exist_ok=True)
+        tmp_paths = {name: temp_path(path, name) for name in (DOCUMENTS_FILE, EMBEDDINGS_FILE, OFFSETS_FILE, META_FILE)}
+        if codes != "none":
+            tmp_paths[CODES_FILE] = temp_path(path, CODES_FILE)
+        if codes == "int8":
+            tmp_paths[SCALES_FILE] = temp_path(path, SCALES_FILE)
+        try:
+            return cls._build(collection, path, dtype, codes, batch_size, collection_writes, tmp_paths)
+        finally:
+            # Temporaries still present here belong to a failed build
+            remove_quietly(tmp_path for tmp_path in tmp_paths.values() if os.path.exists(tmp_path))
+
+    @classmethod
+    def _build(cls, collection, path, dtype, codes, batch_size, collection_writes, tmp_paths):
+        started = time.time()
+        count = collection.count()
+        matrix = code_matrix = scales = None
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        ids_written = 0
+
+        docs_tmp = tmp_paths[DOCUMENTS_FILE]
+        emb_tmp = tmp_paths[EMBEDDINGS_FILE]
+        codes_tmp = tmp_paths.get(CODES_FILE)
+        scales_tmp = tmp_paths.get(SCALES_FILE)
+        with open(docs_tmp, "wb") as docs_file:
+            for offset in range(0, count, batch_size):
+                page = collection.get(include=["embeddings", "documents"], limit=batch_size, offset=offset)
+                embeddings = page.get("embeddings")
+                if embeddings is None or len(embeddings) == 0:
+                    break
+                vectors = _normalize(embeddings)
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(emb_tmp, mode="w+", dtype=dtype, shape=(count, vectors.shape[1]))
+                    if codes != "none":
+                        code_dtype = np.int8 if codes == "int8" else np.float16
+                        code_matrix = np.lib.format.open_memmap(codes_tmp, mode="w+", dtype=code_dtype,
+                                                                shape=(count, vectors.shape[1]))
+                    if codes == "int8":
+                        scales = np.lib.format.open_memmap(scales_tmp, mode="w+", dtype=np.float32, shape=(count,))
+                rows = min(len(vectors), count - ids_written)
+                matrix[ids_written:ids_written + rows] = vectors[:rows].astype(dtype)
+                if codes == "int8":
+                    page_codes, page_scales = quantize_int8(vectors[:rows])
+                    code_matrix[ids_written:ids_written + rows] = page_codes
+                    scales[ids_written:ids_written + rows] = page_scales
+                elif codes != "none":
+                    code_matrix[ids_written:ids_written + rows] = vectors[:rows].astype(np.float16)
+                for i, document in enumerate(page.get("documents", [])[:rows]):
+                    offsets[ids_written + i] = docs_file.tell()
+                    docs_file.write(json.dumps(document, ensure_ascii=False).encode("utf-8") + b"\n")
+                ids_written += rows
+            offsets[ids_written] = docs_file.tell()
+
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(emb_tmp, mode="w+", dtype=dtype, shape=(0, 0))
+        matrix.flush()
+        del matrix
+        if codes != "none" and code_matrix is None:
+            code_matrix = np.lib.format.open_memmap(codes_tmp, mode="w+", dtype=np.float16, shape=(0, 0))
+            if codes == "int8":
+                scales = np.lib.format.open_memmap(scales_tmp, mode="w+", dtype=np.float32, shape=(0,))
+        for array in (code_matrix, scales):
+            if array is not None:
+                array.flush()
+        del code_matrix, scales
+
+        offsets_tmp = tmp_paths[OFFSETS_FILE]
+        with open(offsets_tmp, "wb") as f:
+            np.save(f, offsets[:ids_written + 1])
+        meta = {"count": ids_written, "dtype": dtype, "codes": codes, "collection_count": count,
+                "collection_writes": collection_writes, "built_at": time.time()}
+        meta_tmp = tmp_paths[META_FILE]
+        with open(meta_tmp, "w") as f:
+            json.dump(meta, f)
+
+        # Swap the new files in; processes that still map the old ones keep reading them safely
+        os.replace(emb_tmp, os.path.join(path, EMBEDDINGS_FILE))
+        for tmp_path, name in ((codes_tmp, CODES_FILE), (scales_tmp, SCALES_FILE)):
+            if tmp_path:
+                os.replace(tmp_path, os.path.join(path, name))
+            elif os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        os.replace(offsets_tmp, os.path.join(path, OFFSETS_FILE))
+        os.replace(docs_tmp, os.path.join(path, DOCUMENTS_FILE))
+        os.replace(meta_tmp, os.path.join(path, META_FILE))
+        print(f"✅ Built vector index with {ids_written} vectors ({dtype}, codes: {codes}) in {time.time() - started:.1f}s")
+        return cls(path).load()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, META_FILE))
+
+    def is_current(self, collection_count, collection_writes=None, dtype=VECTOR_INDEX_DTYPE, codes=VECTOR_INDEX_CODES):
+        """
+        True if the loaded snapshot matches the collection (size and write
+        counter, so upserts that keep the size are noticed) and the configured
+        storage format
+        """
+        return (self.meta is not None and self.meta.get("collection_count") == collection_count
+                and self.meta.get("collection_writes") == collection_writes
+                and self.meta.get("dtype") == dtype and self.meta.get("codes", "none") == codes)
+
+    def load(self):
+        with open(os.path.join(self.path, META_FILE)) as f:
+            self.meta = json.load(f)
+        count = self.meta["count"]
+        self.embeddings = np.load(os.path.join(self.path, EMBEDDINGS_FILE), mmap_mode="r")[:count]
+        self.codes = self.scales = None
+        if self.meta.get("codes", "none") != "none":
+            self.codes = np.load(os.path.join(self.path, CODES_FILE), mmap_mode="r")[:count]
+        if self.meta.get("codes") == "int8":
+            self.scales = np.load(os.path.join(self.path, SCALES_FILE), mmap_mode="r")[:count]
+        self.offsets = np.load(os.path.join(self.path, OFFSETS_FILE), mmap_mode="r")
+        self._documents = None
+        if self.meta["count"]:
+            with open(os.path.join(self.path, DOCUMENTS_FILE), "rb") as f:
+                self._documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __len__(self):
+        return 0 if self.meta is None else self.meta["count"]
+
+    def document(self, i):
+        return json.loads(self._documents[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def _top_k(self, scores, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query_embedding, k=5):
+        """Top-k documents for one query embedding, best first"""
+        if not len(self):
+            return []
+        return self.search_many([query_embedding], k)[0]
+
+    def _coarse_scores(self, queries):
+        """Approximate scores from the compact codes, decoding one block of rows at a time"""
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), VECTOR_INDEX_BLOCK_ROWS):
+            end = min(start + VECTOR_INDEX_BLOCK_ROWS, len(self))
+            block = queries @ np.asarray(self.codes[start:end], dtype=np.float32).T
+            if self.scales is not None:
+                block *= self.scales[start:end]
+            scores[:, start:end] = block
+        return scores
+
+    def search_many(self, query_embeddings, k=5, oversample=VECTOR_INDEX_OVERSAMPLE):
+        """Top-k documents for each query embedding, scored with one matrix-matrix product"""
+        if not len(self):
+            return [[] for _ in query_embeddings]
+        queries = _normalize(query_embeddings)
+        if self.codes is None:
+            scores = np.asarray(queries.astype(self.embeddings.dtype) @ self.embeddings.T, dtype=np.float32)
+            return [[self.document(i) for i in self._top_k(row, k)] for row in scores]
+
+        results = []
+        for query, coarse in zip(queries, self._coarse_scores(queries)):
+            # Re-rank the best candidates exactly; fancy indexing touches only their rows
+            candidates = np.sort(self._top_k(coarse, k * max(oversample, 1)))
+            exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query
+            results.append([self.document(candidates[i]) for i in self._top_k(exact, k)])
+        return results
+
+
+if __name__ == "__main__":
+    # python -m Question_generation.vector_index  -> (re)build the snapshot from Chroma
+    from Question_generation.Retrivel import get_collection, collection_version
+    collection = get_collection()
+    if collection is None:
+        raise SystemExit("⚠️ Collection not available, nothing to index")
+    with build_lock(VECTOR_INDEX_PATH):
+        NumpyVectorIndex.build_from_collection(collection, collection_writes=collection_version(collection)[0])
@@ -190,3 +190,40 @@ class DynamicDifficulty:
     def get_current_difficulty(self):
         """Get the current difficulty level"""
         return self.current_difficulty
+
+    def get_reachable_difficulties(self):
+        """Difficulties the next add_score() call can move to (current one first)"""
+        if len(self.recent_scores) + 1 < 2:
+            # add_score() needs at least 2 scores before it changes anything
+            return [self.current_difficulty]
+        reachable = [self._apply_action(action) for action in self._get_valid_actions()]
+        return list(dict.fromkeys([self.current_difficulty] + reachable))
+
+    def to_dict(self):
+        """JSON-serializable learner state (difficulty, recent scores and Q-table)"""
+        return {
+            "current_difficulty": self.current_difficulty,
+            "recent_scores": list(self.recent_scores),
+            "q_table": self.q_table,
+            "learning_rate": self.learning_rate,
+            "discount_factor": self.discount_factor,
+            "exploration_rate": self.exploration_rate
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a learner saved with to_dict()"""
+        adjuster = cls(
+            initial_difficulty=data.get("current_difficulty", "Easy"),
+            learning_rate=data.get("learning_rate", 0.1),
+            discount_factor=data.get("discount_factor", 0.9),
+            exploration_rate=data.get("exploration_rate", 0.2)
+        )
+        adjuster.recent_scores.extend(data.get("recent_scores", []))
+        for state, actions in data.get("q_table", {}).items():
+            adjuster.q_table.setdefault(state, {}).update(actions)
+        return adjuster
+
+    def copy(self):
+        """Independent copy, e.g. to run add_score() before committing to its outcome"""
+        return DynamicDifficulty.from_dict(self.to_dict())
@@ -1,22 +1,62 @@
 import os
+import json
 import requests
 import time
-from flask import Flask, request, jsonify
+import datetime
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from PyPDF2 import PdfReader
-from Question_generation.Retrivel import retrieve_docs_from_all_collections
-from Question_generation.models import InterviewQA, session
+from Question_generation.Retrivel import retrieve_docs_from_all_collections, retrieve_many, start_warm_up, readiness, retrieval_cache_stats
+from Question_generation.models import (
+    InterviewQA, session, latest_question, latest_pending_question, interview_history, feedback_rows,
+    performance_summary
+)
+from Question_generation.db_writer import create_db_writer
+from Question_generation.export import export_rows, ndjson_line, parse_date
 from Evaluation_module.evaluation import evaluate_answer, extract_evaluation
-from Question_generation.llm_utils import parallel_llm_queries
+from Question_generation.llm_utils import parallel_llm_queries, get_llm_client, ThinkStripper, LLMError
+from Question_generation.prefetch import PREFETCH_QUESTIONS
+from Question_generation.resume_digest import ResumeDigestCache
 import re
 import Resume_strengthening.resume_strengthening as rs
-from RL_module.dynamic_difficulty import DynamicDifficulty
 from speech_analysis import SpeechAnalysis
+from session_state import (
+    create_session_store, session_id_from_request, new_session_id, attach_session_id, SESSION_HEADER
+)
 import tempfile
 
 app = Flask(__name__)
-CORS(app)
+# The frontend reads the issued session id from this header and sends it back on every request
+CORS(app, expose_headers=[SESSION_HEADER])
+
+
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    # Return this request's connection to the pool and discard its identity map
+    session.remove()
+
+
+@app.after_request
+def send_session_id(response):
+    # Clients without a session id get a new one, as a cookie and an X-Session-ID header
+    state = g.get("interview_state")
+    if state is not None:
+        attach_session_id(response, state.session_id, issued=g.get("session_id_issued", False))
+    return response
+
+
+@app.teardown_appcontext
+def save_interview_state(exception=None):
+    # Persist the request's interview state if it changed (runs after a streamed response completes)
+    state = g.pop("interview_state", None)
+    if state is not None and json.dumps(state.to_record()) != g.pop("interview_state_snapshot", None):
+        session_states.save(state)
+
+
+# Load the embedding model and Chroma collection in the background so startup stays fast
+if os.environ.get("RETRIEVER_WARMUP", "1") == "1":
+    start_warm_up()
 
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -25,24 +65,135 @@ API_URL = "https://router.huggingface.co/novita/v3/openai/chat/completions"
 API_KEY1 = os.environ.get("HF_API_KEY1", "")
 API_KEY2 = os.environ.get("HF_API_KEY2", "")
 
-resume_text_global = ""
-difficulty_level_global = "Easy"
-last_answer_global = ""  # Hardcoded storage for last answer
-resume_strengthening_global = ""
+FEEDBACK_CHUNK_ROWS = 500  # rows fetched per round trip while streaming /get_feedback
+
+LLM_UNAVAILABLE_REPLY = "The interviewer is temporarily unavailable. Please send your message again in a moment."
 
-# Initialize the dynamic difficulty adjuster
-difficulty_adjuster = DynamicDifficulty(initial_difficulty="Easy")
+# Per-session interview state (resume, difficulty, RL adjuster, prefetcher), keyed by X-Session-ID / cookie
+session_states = create_session_store()
+
+# InterviewQA writes: committed in the request, or queued write-behind with DB_WRITE_BEHIND=1
+db_writer = create_db_writer()
 
 # Initialize the speech analyzer
 speech_analyzer = SpeechAnalysis()
 
+# Compact resume profiles, used in prompts once the raw resume exceeds RESUME_TOKEN_BUDGET
+resume_digests = ResumeDigestCache()
+
+QUESTION_SYSTEM_PROMPT = "You are an HR interviewer. Your ONLY job is to ask a single HR interview question at a time. DO NOT provide answers. DO NOT provide explanations. Ask a question that is suitable for the interview. Only output the question itself."
+
 def remove_first_think(text):
     # Remove only the first occurrence of <think>...</think> and its content
     return re.sub(r'<think>.*?</think>', '', text, count=1, flags=re.DOTALL)
 
+def build_next_question_messages(resume_text, context_docs, difficulty, last_response=None, previous_question=None):
+    """Prompt for the next question; without last_response it is a generic follow-up (used for prefetching)"""
+    if last_response is not None:
+        instruction = (
+            f"Candidate's last response: {last_response}\n\n"
+            f"Based on the resume, context, and previous response, ask the next HR question. "
+        )
+    else:
+        instruction = (
+            f"Previous question: {previous_question}\n\n"
+            f"Based on the resume and context, ask the next HR question. It must differ from the previous question. "
+        )
+    return [
+        {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Candidate's resume:\n{resume_text}\n\n"
+                f"Context from HR documentation:\n{context_docs}\n\n"
+                + instruction +
+                f"Difficulty: {difficulty}. Just ask a question."
+                "IMPORTANT: Only ask the question. Do not provide answers or explanations. "
+                "Output only the question. "
+                "Address the candidate with his name"
+            )
+        }
+    ]
+
+def current_state():
+    """Interview state of the session this request belongs to, loaded once per request"""
+    if "interview_state" not in g:
+        session_id = session_id_from_request(request)
+        if session_id is None:
+            session_id = new_session_id()
+            g.session_id_issued = True
+        g.interview_state = session_states.get(session_id)
+        g.interview_state_snapshot = json.dumps(g.interview_state.to_record())
+    return g.interview_state
+
+def start_prefetch(state, previous_question):
+    """Speculatively generate the next question for every difficulty the RL module may pick"""
+    if not PREFETCH_QUESTIONS:
+        return
+    # Never wait for a digest here: candidates use whatever resume text is ready now
+    resume_text = resume_digests.for_prompt(state.resume_text, API_KEY1, wait=0)
+
+    def build_messages(difficulty):
+        context_docs = "\n\n".join(retrieve_docs_from_all_collections(f"{difficulty} HR interview questions", k=3))
+        return build_next_question_messages(resume_text, context_docs, difficulty, previous_question=previous_question)
+
+    state.prefetcher.start(state.difficulty_adjuster.get_reachable_difficulties(), build_messages, API_KEY1)
+
+def ndjson_response(payload):
+    """Single-line NDJSON reply for stream requests that have nothing to stream"""
+    return Response(json.dumps(payload) + "\n", mimetype="application/x-ndjson")
+
+def llm_unavailable(error):
+    """503 response used when a question could not be generated; nothing is written to the database"""
+    print(f"LLM call failed: {error}")
+    return jsonify({"error": str(error), "reply": LLM_UNAVAILABLE_REPLY}), 503
+
+def future_result_or_error(future):
+    """Result of an LLM future, or the LLMError it failed with"""
+    try:
+        return future.result()
+    except LLMError as e:
+        return e
+    except Exception as e:
+        return LLMError(str(e))
+
+def stream_question(messages, api_key, finalize):
+    """
+    Stream the visible question tokens as NDJSON lines ({"token": ...}) while the
+    model is still generating, then emit finalize(question) as the last line.
+    The last line always carries the complete "reply" and is authoritative.
+    """
+    def generate():
+        client = get_llm_client()
+        stripper = ThinkStripper()
+        parts = []
+        try:
+            for delta in client.stream(messages, api_key):
+                visible = stripper.feed(delta)
+                if visible:
+                    parts.append(visible)
+                    yield json.dumps({"token": visible}) + "\n"
+            tail = stripper.flush()
+            if tail:
+                parts.append(tail)
+                yield json.dumps({"token": tail}) + "\n"
+            question = "".join(parts).strip()
+        except Exception as e:
+            # Fall back to a regular completion so the turn still succeeds
+            print(f"Error streaming LLM response, falling back to full completion: {e}")
+            result = future_result_or_error(client.submit(messages, api_key))
+            if isinstance(result, LLMError):
+                print(f"LLM call failed: {result}")
+                yield json.dumps({"error": str(result), "reply": LLM_UNAVAILABLE_REPLY}) + "\n"
+                return
+            question = remove_first_think(result.strip())
+        yield json.dumps(finalize(question)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @app.route('/upload_resume', methods=['POST'])
 def upload_resume():
-    global resume_text_global, difficulty_level_global, resume_strengthening_global, difficulty_adjuster
+    state = current_state()
 
     if 'resume' not in request.files:
         return jsonify({'error': 'No resume uploaded'}), 400
@@ -50,10 +201,8 @@ def upload_resume():
     file = request.files['resume']
     job_description = request.form.get('job_description', '')
     difficulty = request.form.get('difficulty', 'Easy')
-    difficulty_level_global = difficulty
-    
     # Initialize the difficulty adjuster with the selected difficulty
-    difficulty_adjuster = DynamicDifficulty(initial_difficulty=difficulty)
+    state.reset(difficulty)
 
     if file.filename == '':
         return jsonify({'error': 'Empty filename'}), 400
@@ -67,74 +216,92 @@ def upload_resume():
     try:
         reader = PdfReader(filepath)
         text = ''.join([page.extract_text() or '' for page in reader.pages])
-        resume_text_global = text
-        resume_strengthening_global = rs.strengthen_resume(resume_text_global, job_description)
+        state.resume_text = text
+        # Digest long resumes once, in the background, so every turn can send the compact profile
+        resume_digests.submit(text, API_KEY1)
+        state.resume_strengthening = rs.strengthen_resume(state.resume_text, job_description)
         return jsonify({
             'text': text,
             'job_description': job_description,
             'difficulty': difficulty,
-            'resume_strengthening': resume_strengthening_global
+            'resume_strengthening': state.resume_strengthening
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    global resume_text_global, difficulty_level_global, last_answer_global, difficulty_adjuster
+    state = current_state()
+    # Read-your-writes: this session's queued writes are committed before its rows are read
+    db_writer.wait_for_session(state.session_id)
 
     data = request.get_json()
     user_message = data.get("message", "").strip()
+    stream_requested = bool(data.get("stream"))
     
     # Check if frontend is setting a manual difficulty override
-    if data.get("current_difficulty") and data.get("current_difficulty") != difficulty_level_global:
-        difficulty_level_global = data.get("current_difficulty")
-        difficulty_adjuster.current_difficulty = difficulty_level_global
+    if data.get("current_difficulty") and data.get("current_difficulty") != state.difficulty:
+        state.difficulty = data.get("current_difficulty")
+        state.difficulty_adjuster.current_difficulty = state.difficulty
 
     if not user_message:
         return jsonify({"reply": "Please type a message."})
 
-    # Get context for all questions with difficulty level
-    context_docs = "\n\n".join(retrieve_docs_from_all_collections(f"{difficulty_level_global} HR interview questions", k=3))
+    # Long resumes are replaced by their compact profile to keep per-turn prompts small
+    resume_prompt_text = ""
+    if user_message.lower() != "exit":
+        resume_prompt_text = resume_digests.for_prompt(state.resume_text, API_KEY1)
+
+    # Context for all questions with difficulty level
+    context_query = f"{state.difficulty} HR interview questions"
 
     # If not starting, evaluate and store the previous answer
     if user_message.lower() == "start":
+        context_docs = "\n\n".join(retrieve_docs_from_all_collections(context_query, k=3))
         # First question generation
         prompt = (
             f"You are an HR interviewer conducting a real interview.\n\n"
-            f"Candidate's resume:\n{resume_text_global}\n\n"
-            f"Context from {difficulty_level_global} HR questions:\n{context_docs}\n\n"
+            f"Candidate's resume:\n{resume_prompt_text}\n\n"
+            f"Context from {state.difficulty} HR questions:\n{context_docs}\n\n"
             "Your task: ask the FIRST HR interview question. "
             "IMPORTANT: Only ask the question. Do not provide answers or explanations. "
             "Output only the question. "
             "Address the candidate with his name"
         )
         messages = [
-            {"role": "system", "content": "You are an HR interviewer. Your ONLY job is to ask a single HR interview question at a time. DO NOT provide answers. DO NOT provide explanations. Ask a question that is suitable for the interview. Only output the question itself."},
+            {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
         
+        def store_first_question(reply):
+            # Store the first question
+            db_writer.insert(
+                session_id=state.session_id,
+                question=reply,
+                difficulty=state.difficulty,
+                answer="",
+                score=0
+            )
+
+            state.last_answer = ""
+            start_prefetch(state, reply)
+            return {"reply": reply}
+
+        if stream_requested:
+            return stream_question(messages, API_KEY1, store_first_question)
+
         # For first question, we only need one API call
         tasks = [(messages, API_KEY1)]
-        results = parallel_llm_queries(tasks)
+        results = parallel_llm_queries(tasks, return_exceptions=True)
+        if isinstance(results[0], LLMError):
+            return llm_unavailable(results[0])
         reply = remove_first_think(results[0].strip())
-        
-        # Store the first question
-        new_question = InterviewQA(
-            question=reply,
-            difficulty=difficulty_level_global,
-            answer="",
-            score=0
-        )
-        session.add(new_question)
-        session.commit()
-        
-        last_answer_global = ""
-        return jsonify({"reply": reply})
+        return jsonify(store_first_question(reply))
         
 
     elif(user_message.lower() == "exit"):
-        # When user types "exit", return all QAs from the database as JSON (no overall feedback)
-        all_qas = session.query(InterviewQA).order_by(InterviewQA.timestamp).all()
+        # When user types "exit", return this interview's QAs as JSON (no overall feedback)
+        all_qas = interview_history(session, state.session_id).all()
         if not all_qas:
             return jsonify({"reply": "No interview data found to generate feedback."})
         # Prepare a list of QAs
@@ -151,111 +318,157 @@ def chat():
                 'difficulty': qa.difficulty,
                 'timestamp': qa.timestamp.isoformat() if qa.timestamp else None
             })
-        # Store the JSON in a variable before deleting
-        exit_data = {"qas": qa_list, "resume_strengthening": resume_strengthening_global}
-        # Optionally clear the table after returning
-        session.query(InterviewQA).delete()
-        session.commit()
+        state.discard_prefetch()
+        exit_data = {"qas": qa_list, "resume_strengthening": state.resume_strengthening}
+        # Archive the interview: it leaves the session's hot paths but stays available to /export
+        db_writer.archive_session(state.session_id)
         # Return the JSON in a frontend-friendly format (always as a 'qas' array)
         return jsonify(exit_data)
 
     else:
         # Get the last question from the database
-        last_question = session.query(InterviewQA).order_by(InterviewQA.id.desc()).first()
+        last_question = latest_question(session, state.session_id)
         if last_question:  # Only update if answer is empty
+            # Question context and evaluation guidelines come from one batched encode and search
+            question_docs, eval_docs = retrieve_many([context_query, last_question.question], k=3)
+            context_docs = "\n\n".join(question_docs)
+
             # Prepare evaluation messages
-            eval_messages = evaluate_answer(last_question.question, user_message, difficulty_level_global)
+            eval_messages = evaluate_answer(last_question.question, user_message, state.difficulty, context=eval_docs)
             
             # Generate next question and evaluate answer in parallel
-            next_q_messages = [
-                {"role": "system", "content": "You are an HR interviewer. Your ONLY job is to ask a single HR interview question at a time. DO NOT provide answers. DO NOT provide explanations. Ask a question that is suitable for the interview. Only output the question itself."},
-                {
-                    "role": "user",
-                    "content": (
-                        f"Candidate's resume:\n{resume_text_global}\n\n"
-                        f"Context from HR documentation:\n{context_docs}\n\n"
-                        f"Candidate's last response: {user_message}\n\n"
-                        f"Based on the resume, context, and previous response, ask the next HR question. "
-                        f"Difficulty: {difficulty_level_global}. Just ask a question."
-                        "IMPORTANT: Only ask the question. Do not provide answers or explanations. "
-                        "Output only the question. "
-                        "Address the candidate with his name"
-                    )
+            next_q_messages = build_next_question_messages(
+                resume_prompt_text, context_docs, state.difficulty, last_response=user_message
+            )
+
+            def judge_answer(evaluation_response):
+                """Score the answer and let a copy of the RL module pick the next difficulty; nothing is stored yet"""
+                changes = {"answer": user_message}
+                if isinstance(evaluation_response, LLMError):
+                    # Don't record a failed evaluation as a score of 0
+                    print(f"Evaluation failed for question ID {last_question.id}: {evaluation_response}")
+                    score = None
+                    changes["feedback"] = "Evaluation unavailable: the evaluator could not be reached."
+                else:
+                    # Process evaluation
+                    score, reason, improvement = extract_evaluation(evaluation_response)
+                    changes["score"] = score
+                    changes["feedback"] = f"Reason: {reason}\nImprovement Areas: {improvement}"
+                    # Scored answers feed the per-user performance aggregates
+                    changes["scored_at"] = datetime.datetime.utcnow()
+
+                # Make sure confidence score is preserved if it was previously set
+                if not hasattr(last_question, 'confidence_score') or last_question.confidence_score is None:
+                    changes["confidence_score"] = 0.0
+
+                # Use the RL module to adjust difficulty based on the user's score
+                adjuster = state.difficulty_adjuster.copy()
+                if score is not None:
+                    new_difficulty, explanation = adjuster.add_score(score)
+                else:
+                    new_difficulty, explanation = state.difficulty, None
+                return changes, score, adjuster, new_difficulty, explanation
+
+            def record_answer(changes, score, adjuster, new_difficulty, explanation):
+                """Store a judged answer and move the session to the difficulty picked for it"""
+                # Commit changes to database
+                db_writer.update(last_question, **changes)
+                print(f"Updated question ID: {last_question.id} with score: {score}, confidence: {last_question.confidence_score}")
+                state.difficulty_adjuster = adjuster
+
+                # Check if difficulty changed
+                difficulty_changed = new_difficulty != state.difficulty
+                if difficulty_changed:
+                    state.difficulty = new_difficulty
+                return difficulty_changed, new_difficulty, explanation
+
+            def score_answer(evaluation_response):
+                """Record the evaluation and let the RL module pick the next difficulty"""
+                return record_answer(*judge_answer(evaluation_response))
+
+            def store_next_question(next_question, difficulty_changed, new_difficulty, explanation):
+                # Store the new question
+                db_writer.insert(
+                    session_id=state.session_id,
+                    question=next_question,
+                    difficulty=state.difficulty,
+                    answer="",
+                    score=0
+                )
+                start_prefetch(state, next_question)
+
+                # Get confidence data if available
+                confidence_score = getattr(last_question, 'confidence_score', 0)
+                confidence_feedback = getattr(last_question, 'confidence_feedback', '')
+
+                # Include suggested difficulty in response if changed
+                if difficulty_changed:
+                    return {
+                        "reply": next_question,
+                        "suggested_difficulty": new_difficulty,
+                        "difficulty_explanation": explanation,
+                        "confidence_score": confidence_score,
+                        "confidence_feedback": confidence_feedback
+                    }
+                return {
+                    "reply": next_question,
+                    "confidence_score": confidence_score,
+                    "confidence_feedback": confidence_feedback
                 }
-            ]
-            
+
+            def finalize_turn(next_question, evaluation_response):
+                return store_next_question(next_question, *score_answer(evaluation_response))
+
+            if PREFETCH_QUESTIONS and state.prefetcher.has_candidates():
+                # The next question was generated speculatively; only the evaluation is on the critical path
+                # Nothing is stored until the next question is in hand, so a 503 leaves the turn
+                # untouched and a resent answer isn't scored twice
+                evaluation_response = future_result_or_error(get_llm_client().submit(eval_messages, API_KEY2))
+                judgement = judge_answer(evaluation_response)
+                next_difficulty = judgement[3]
+                prefetched = state.prefetcher.take(next_difficulty)
+                if prefetched is not None:
+                    next_question = remove_first_think(prefetched.strip())
+                else:
+                    next_q_messages = build_next_question_messages(
+                        resume_prompt_text, context_docs, next_difficulty, last_response=user_message
+                    )
+                    results = parallel_llm_queries([(next_q_messages, API_KEY1)], return_exceptions=True)
+                    if isinstance(results[0], LLMError):
+                        return llm_unavailable(results[0])
+                    next_question = remove_first_think(results[0].strip())
+                payload = store_next_question(next_question, *record_answer(*judgement))
+                return ndjson_response(payload) if stream_requested else jsonify(payload)
+
+            if stream_requested:
+                # Evaluate in the background while the next question streams to the client
+                eval_future = get_llm_client().submit(eval_messages, API_KEY2)
+                return stream_question(
+                    next_q_messages, API_KEY1,
+                    lambda next_question: finalize_turn(next_question, future_result_or_error(eval_future))
+                )
+
             # Run LLM queries in parallel
             tasks = [
                 (next_q_messages, API_KEY1),  # Generate next question
                 (eval_messages, API_KEY2)      # Evaluate current answer
             ]
-            results = parallel_llm_queries(tasks)
-            
+            results = parallel_llm_queries(tasks, return_exceptions=True)
+            if isinstance(results[0], LLMError):
+                return llm_unavailable(results[0])
+
             # Extract results
             next_question = remove_first_think(results[0].strip())
             evaluation_response = results[1]
-            
-            # Process evaluation
-            score, reason, improvement = extract_evaluation(evaluation_response)
-            
-            
-            last_question.answer = user_message
-            last_question.score = score
-            last_question.feedback = f"Reason: {reason}\nImprovement Areas: {improvement}"
-            
-            # Make sure confidence score is preserved if it was previously set
-            if not hasattr(last_question, 'confidence_score') or last_question.confidence_score is None:
-                last_question.confidence_score = 0.0
-                
-            # Commit changes to database
-            session.commit()
-            print(f"Updated question ID: {last_question.id} with score: {score}, confidence: {last_question.confidence_score}")
-            
-            # Use the RL module to adjust difficulty based on the user's score
 
-            new_difficulty, explanation = difficulty_adjuster.add_score(score)
-            
-            # Check if difficulty changed
-            difficulty_changed = new_difficulty != difficulty_level_global
-            if difficulty_changed:
-                difficulty_level_global = new_difficulty
-            
-            # Store the new question
-            new_question = InterviewQA(
-                question=next_question,
-                difficulty=difficulty_level_global,
-                answer="",
-                score=0
-            )
-            session.add(new_question)
-            session.commit()
-            
-            # Get confidence data if available
-            confidence_score = getattr(last_question, 'confidence_score', 0)
-            confidence_feedback = getattr(last_question, 'confidence_feedback', '')
-            
-            # Include suggested difficulty in response if changed
-            if difficulty_changed:
-                return jsonify({
-                    "reply": next_question,
-                    "suggested_difficulty": new_difficulty,
-                    "difficulty_explanation": explanation,
-                    "confidence_score": confidence_score,
-                    "confidence_feedback": confidence_feedback
-                })
-            else:
-                return jsonify({
-                    "reply": next_question,
-                    "confidence_score": confidence_score,
-                    "confidence_feedback": confidence_feedback
-                })
+            return jsonify(finalize_turn(next_question, evaluation_response))
         else:
             # If we get here, we either have no last question, or the last question already has an answer
             # In both cases, we need to return something to avoid the None response error
             if last_question and last_question.answer:
                 print(f"Question ID {last_question.id} already has an answer: '{last_question.answer}'")
                 # Get the last question with an empty answer, or create a new one if none exists
-                new_last_question = session.query(InterviewQA).filter(InterviewQA.answer == "").order_by(InterviewQA.id.desc()).first()
+                new_last_question = latest_pending_question(session, state.session_id)
                 
                 if new_last_question:
                     print(f"Found unanswered question ID {new_last_question.id}: '{new_last_question.question}'")
@@ -270,21 +483,23 @@ def chat():
                     # Generate a new question
                     new_q_messages = [
                         {"role": "system", "content": "You are an HR interviewer. Your ONLY job is to ask a single HR interview question at a time."},
-                        {"role": "user", "content": f"Ask a new HR interview question at {difficulty_level_global} difficulty level."}
+                        {"role": "user", "content": f"Ask a new HR interview question at {state.difficulty} difficulty level."}
                     ]
                     tasks = [(new_q_messages, API_KEY1)]
-                    results = parallel_llm_queries(tasks)
+                    results = parallel_llm_queries(tasks, return_exceptions=True)
+                    if isinstance(results[0], LLMError):
+                        return llm_unavailable(results[0])
                     new_question_text = remove_first_think(results[0].strip())
                     
                     # Store the new question
-                    new_question = InterviewQA(
+                    db_writer.insert(
+                        session_id=state.session_id,
                         question=new_question_text,
-                        difficulty=difficulty_level_global,
+                        difficulty=state.difficulty,
                         answer="",
                         score=0
                     )
-                    session.add(new_question)
-                    session.commit()
+                    start_prefetch(state, new_question_text)
                     
                     return jsonify({
                         "reply": new_question_text,
@@ -296,21 +511,23 @@ def chat():
                 # Generate a first question
                 first_q_messages = [
                     {"role": "system", "content": "You are an HR interviewer. Your ONLY job is to ask a single HR interview question at a time."},
-                    {"role": "user", "content": f"Ask an initial HR interview question at {difficulty_level_global} difficulty level."}
+                    {"role": "user", "content": f"Ask an initial HR interview question at {state.difficulty} difficulty level."}
                 ]
                 tasks = [(first_q_messages, API_KEY1)]
-                results = parallel_llm_queries(tasks)
+                results = parallel_llm_queries(tasks, return_exceptions=True)
+                if isinstance(results[0], LLMError):
+                    return llm_unavailable(results[0])
                 first_question = remove_first_think(results[0].strip())
                 
                 # Store the first question
-                new_question = InterviewQA(
+                db_writer.insert(
+                    session_id=state.session_id,
                     question=first_question,
-                    difficulty=difficulty_level_global,
+                    difficulty=state.difficulty,
                     answer="",
                     score=0
                 )
-                session.add(new_question)
-                session.commit()
+                start_prefetch(state, first_question)
                 
                 return jsonify({
                     "reply": first_question,
@@ -319,89 +536,154 @@ def chat():
             
         # This line should never be reached as all paths now return a response
         # But keeping it as a fallback just in case
-        last_answer_global = user_message
+        state.last_answer = user_message
         return jsonify({"reply": "Please type 'start' to begin the interview."})
         
 
 @app.route('/get_feedback', methods=['GET'])
 def get_feedback():
+    """
+    Answered questions with their feedback, streamed as one JSON document.
+
+    Query parameters: after_id (cursor, default 0), limit (page size, default all),
+    session_id (default: the caller's session), user_id (all of a user's sessions; combined
+    with session_id when both are given), difficulty and include_archived (1 adds
+    interviews that have ended). When a page is full the response carries
+    next_after_id for the following request.
+    """
     try:
-        # Get all interview QAs from the database that have answers and feedback
-        feedback_items = session.query(InterviewQA).filter(InterviewQA.answer != "").all()
-        print(f"Found {len(feedback_items)} feedback items in database")
-        
-        # Convert SQLAlchemy objects to dictionaries
-        feedback_data = []
-        for item in feedback_items:
-            # Debug each item
-            print(f"Processing item ID: {item.id}, Question: {item.question[:30]}...")
-            print(f"  Raw confidence_score: {item.confidence_score}, Type: {type(item.confidence_score)}")
-            
-            # Direct database check to verify data
-            # Connect directly to the database to verify
-            import sqlite3
-            conn = sqlite3.connect('interview.db')
-            cursor = conn.cursor()
-            cursor.execute('SELECT confidence_score, confidence_feedback FROM interview_qa WHERE id = ?', (item.id,))
-            db_result = cursor.fetchone()
-            print(f"  From direct DB query: confidence_score={db_result[0]}, feedback={db_result[1][:30] if db_result[1] else None}")
-            conn.close()
-            
-            # Safely get confidence_score with a fallback to 0
-            try:
-                if hasattr(item, 'confidence_score') and item.confidence_score is not None:
-                    confidence_score = float(item.confidence_score)
-                    print(f"  Converted confidence_score: {confidence_score}")
-                else:
-                    confidence_score = 0.0
-                    print(f"  No confidence_score attribute or value is None, using default: {confidence_score}")
-            except (ValueError, TypeError) as e:
-                confidence_score = 0.0
-                print(f"  Error converting confidence_score: {e}, using default: {confidence_score}")
-                
-            # Only include essential confidence feedback without verbose details
-            confidence_feedback = None
-            if hasattr(item, 'confidence_feedback') and item.confidence_feedback:
-                # Extract just the first sentence which typically has the confidence assessment
-                feedback_parts = item.confidence_feedback.split('.')
-                if feedback_parts:
-                    confidence_feedback = feedback_parts[0] + "."
-                print(f"  Using confidence_feedback: {confidence_feedback}")
-            else:
-                print("  No confidence_feedback attribute or it's empty")
-            
-            feedback_data.append({
-                'id': item.id,
-                'question': item.question,
-                'answer': item.answer,
-                'difficulty': item.difficulty,
-                'score': float(item.score),  # Ensure this is sent as a float
-                'feedback': item.feedback,
-                'timestamp': item.timestamp.isoformat() if item.timestamp else None,
-                'confidence_score': confidence_score,
-                'confidence_feedback': confidence_feedback
-            })
-        
-        return jsonify({
-            'success': True,
-            'feedback': feedback_data
-        })
-    except Exception as e:
-        print(f"Error in get_feedback: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        after_id = int(request.args.get('after_id', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'after_id and limit must be integers'}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({'success': False, 'error': 'limit must be positive'}), 400
+
+    user_id = request.args.get('user_id')
+    session_id = request.args.get('session_id') or (None if user_id else current_state().session_id)
+    if session_id:
+        db_writer.wait_for_session(session_id)
+    else:
+        db_writer.flush()
+    rows = feedback_rows(
+        session,
+        user_id=user_id,
+        session_id=session_id,
+        difficulty=request.args.get('difficulty'),
+        after_id=after_id,
+        limit=limit,
+        include_archived=request.args.get('include_archived') == '1'
+    ).yield_per(FEEDBACK_CHUNK_ROWS)
+
+    def feedback_item(row):
+        row_id, question, answer, difficulty, score, feedback, timestamp, confidence_score, confidence_feedback = row
+        # Only include the first sentence of the confidence feedback, which carries the assessment
+        if confidence_feedback:
+            confidence_feedback = confidence_feedback.split('.')[0] + "."
+        return {
+            'id': row_id,
+            'question': question,
+            'answer': answer,
+            'difficulty': difficulty,
+            'score': float(score or 0.0),
+            'feedback': feedback,
+            'timestamp': timestamp.isoformat() if timestamp else None,
+            'confidence_score': float(confidence_score) if confidence_score is not None else 0.0,
+            'confidence_feedback': confidence_feedback or None
+        }
+
+    def generate():
+        yield '{"feedback": ['
+        count, last_id = 0, None
+        try:
+            for row in rows:
+                yield (',' if count else '') + json.dumps(feedback_item(row))
+                count += 1
+                last_id = row[0]
+        except Exception as e:
+            # Headers are already sent; end the document with the error instead of a 500
+            print(f"Error in get_feedback: {str(e)}")
+            yield '], "success": false, "error": ' + json.dumps(str(e)) + '}'
+            return
+        next_after_id = last_id if limit and count == limit else None
+        yield '], "success": true, "count": ' + json.dumps(count) + ', "next_after_id": ' + json.dumps(next_after_id) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/get_performance', methods=['GET'])
+def get_performance():
+    """
+    Progress dashboard data from the incrementally maintained aggregates:
+    per day x difficulty and per difficulty overall, count plus mean and
+    standard deviation of score and confidence score. Query parameters:
+    user_id (default "guest") and days (only the last N days).
+    """
+    days = request.args.get('days', type=int)
+    if days is not None and days <= 0:
+        return jsonify({'success': False, 'error': 'days must be positive'}), 400
+    user_id = request.args.get('user_id', 'guest')
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1) if days else None
+
+    # Aggregates are written with the scored rows; let queued writes land first
+    db_writer.flush()
+    summary = performance_summary(session, user_id=user_id, since=since)
+    return jsonify({'success': True, 'user_id': user_id, **summary})
+
+@app.route('/export', methods=['GET'])
+def export_interviews():
+    """
+    Every stored question, archived interviews included, streamed as NDJSON in
+    id order with constant memory. Query parameters (all optional): since and
+    until (ISO dates, inclusive), user_id, session_id and active_only=1.
+    Parquet output is available from python -m Question_generation.export.
+    """
+    try:
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'), end=True)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since and until must be ISO dates'}), 400
+
+    db_writer.flush()
+    rows = export_rows(
+        session,
+        since=since,
+        until=until,
+        user_id=request.args.get('user_id'),
+        session_id=request.args.get('session_id'),
+        include_archived=request.args.get('active_only') != '1'
+    )
+
+    def generate():
+        for row in rows:
+            yield ndjson_line(row)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=interviews.ndjson'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the retriever (encoder + collection) is loaded, 503 before."""
+    status = readiness()
+    status['cache'] = retrieval_cache_stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/llm_stats', methods=['GET'])
+def llm_stats():
+    """Cache and request counters for the shared LLM client."""
+    stats = get_llm_client().stats()
+    stats["prefetch"] = session_states.prefetch_stats() if PREFETCH_QUESTIONS else None
+    stats["sessions"] = session_states.stats()
+    stats["db_writes"] = db_writer.stats()
+    return jsonify(stats)
 
 @app.route('/get_difficulty', methods=['GET'])
 def get_difficulty():
-    global difficulty_level_global, difficulty_adjuster
+    state = current_state()
     
     return jsonify({
-        'current_difficulty': difficulty_level_global,
-        'available_difficulties': difficulty_adjuster.difficulties
+        'current_difficulty': state.difficulty,
+        'available_difficulties': state.difficulty_adjuster.difficulties
     })
     
 @app.route('/update_confidence', methods=['POST'])
@@ -415,19 +697,21 @@ def update_confidence():
         if not question_id or confidence_score is None:
             return jsonify({'error': 'Missing question ID or confidence score'}), 400
             
-        # Find the question in the database
+        # Find the question in the database (any session's queued writes land first)
+        db_writer.flush()
         question = session.query(InterviewQA).filter(InterviewQA.id == question_id).first()
         if not question:
             return jsonify({'error': f'Question with ID {question_id} not found'}), 404
             
-        # Update the confidence score
-        question.confidence_score = float(confidence_score)
-        
         # Generate new confidence feedback based on the score
         analysis = speech_analyzer.analyze_speech(question.answer if question.answer else "")
-        question.confidence_feedback = analysis['feedback']
-        
-        session.commit()
+
+        # Update the confidence score
+        db_writer.update(
+            question,
+            confidence_score=float(confidence_score),
+            confidence_feedback=analysis['feedback']
+        )
         
         return jsonify({
             'success': True,
@@ -615,18 +899,19 @@ def transcribe_audio():
         print(f"Analysis results: {analysis_results}")
         
         # If this is an answer to a question, update the database
-        last_question = session.query(InterviewQA).order_by(InterviewQA.id.desc()).first()
+        session_id = current_state().session_id
+        db_writer.wait_for_session(session_id)
+        last_question = latest_question(session, session_id)
         if last_question and last_question.answer == "":
-            # First, update the answer with the transcript
-            last_question.answer = transcript
-            
-            # Update the confidence score and feedback in database
+            # Update the answer with the transcript, plus the confidence score and feedback
             print(f"Updating confidence data for question ID: {last_question.id}")
-            last_question.confidence_score = analysis_results['confidence_score']
-            last_question.confidence_feedback = analysis_results['feedback']
-            
-            # Commit these changes immediately to ensure they're saved before another question is asked
-            session.commit()
+            # Saved before another question is asked: the next /chat of this session waits for queued writes
+            db_writer.update(
+                last_question,
+                answer=transcript,
+                confidence_score=analysis_results['confidence_score'],
+                confidence_feedback=analysis_results['feedback']
+            )
             print(f"Database updated with confidence score: {last_question.confidence_score}")
             
             # Return a simplified response without detailed feedback
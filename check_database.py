@@ -5,15 +5,13 @@ def format_timestamp(timestamp):
     return timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
 def display_all_interviews():
-    # Get all QA pairs ordered by timestamp
-    all_qas = session.query(InterviewQA).order_by(InterviewQA.timestamp).all()
-    
-    if not all_qas:
-        print("No interviews found in the database.")
-        return
+    # Stream QA pairs ordered by timestamp, a chunk at a time, so large tables don't fill memory
+    all_qas = session.query(InterviewQA).order_by(InterviewQA.timestamp).yield_per(500)
     
     current_date = None
+    shown = 0
     for qa in all_qas:
+        shown += 1
         # Format the date for grouping interviews by day
         interview_date = qa.timestamp.date()
         
@@ -24,6 +22,8 @@ def display_all_interviews():
             
         print(f"\nTime: {format_timestamp(qa.timestamp)}")
         print(f"Difficulty: {qa.difficulty}")
+        if qa.archived_at:
+            print(f"Archived: {format_timestamp(qa.archived_at)}")
         print(f"Q: {qa.question}")
         print(f"A: {qa.answer if qa.answer else '[No answer yet]'}")
         if qa.score is not None:
@@ -38,6 +38,9 @@ def display_all_interviews():
             print(f"Speech Feedback: {qa.confidence_feedback}")
         print("-" * 50)
 
+    if not shown:
+        print("No interviews found in the database.")
+
 if __name__ == "__main__":
     print("Retrieving interview data from database...")
     display_all_interviews()
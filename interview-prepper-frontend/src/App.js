@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import Chat from "./chat";
+import { apiFetch } from "./api";
 import "./App.css";
 
 function App() {
@@ -65,7 +66,7 @@ function App() {
     formData.append("difficulty", difficulty);
 
     try {
-      const response = await fetch("http://localhost:8000/upload_resume", {
+      const response = await apiFetch("/upload_resume", {
         method: "POST",
         body: formData
       });
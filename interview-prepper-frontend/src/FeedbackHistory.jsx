@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { apiFetch } from './api';
 
 /**
  * Component to display feedback history for all answered questions
@@ -17,7 +18,7 @@ const FeedbackHistory = ({ isOpen, onClose }) => {
   const fetchFeedback = async () => {
     try {
       setLoading(true);
-      const response = await fetch('http://localhost:8000/get_feedback');
+      const response = await apiFetch('/get_feedback');
       const data = await response.json();
       
       if (data.success) {
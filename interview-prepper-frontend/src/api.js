@@ -0,0 +1,66 @@
+const API_BASE = "http://localhost:8000";
+const SESSION_HEADER = "X-Session-ID";
+const SESSION_KEY = "interviewSessionId";
+
+/**
+ * fetch() against the backend that keeps this tab's interview session:
+ * the backend issues a session id on the first request, and every later
+ * request sends it back so concurrent interviews don't share state.
+ */
+export const apiFetch = async (path, options = {}) => {
+  const headers = new Headers(options.headers || {});
+  const sessionId = sessionStorage.getItem(SESSION_KEY);
+  if (sessionId) {
+    headers.set(SESSION_HEADER, sessionId);
+  }
+
+  const response = await fetch(`${API_BASE}${path}`, { ...options, headers });
+
+  const issuedId = response.headers.get(SESSION_HEADER);
+  if (issuedId) {
+    sessionStorage.setItem(SESSION_KEY, issuedId);
+  }
+  return response;
+};
+
+/**
+ * Read a /chat response sent with `stream: true`. NDJSON bodies are read
+ * line by line: {"token": ...} lines go to onToken as they arrive, and the
+ * last line (the authoritative reply payload) is returned. Plain JSON
+ * responses (exit, errors, cached turns) are returned as they are.
+ */
+export const readChatReply = async (response, onToken) => {
+  const contentType = response.headers.get("Content-Type") || "";
+  if (!contentType.includes("application/x-ndjson") || !response.body) {
+    return response.json();
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = null;
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const item = JSON.parse(line);
+    if ("token" in item) {
+      onToken(item.token);
+    } else {
+      reply = item;
+    }
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer + decoder.decode());
+
+  if (reply === null) {
+    throw new Error("Chat stream ended without a reply");
+  }
+  return reply;
+};
@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from "react";
 import ConfirmationModal from "./ConfirmationModal";
 import FeedbackHistory from "./FeedbackHistory";
 import VoiceButton from "./voice-button";
+import { apiFetch, readChatReply } from "./api";
 import "./Modal.css";
 import "./chat-controls.css";
 import "./voice-button.css";
@@ -72,6 +73,47 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
     }
   }, [typingEffect, typingIndex, botResponse]);
 
+  // Append a streamed question delta to the in-progress bot message
+  const appendStreamedToken = (token) => {
+    setMessages((prevMessages) => {
+      const current = prevMessages.find((msg) => msg.id === "streaming");
+      return [
+        ...prevMessages.filter((msg) => msg.id !== "streaming"),
+        { sender: "bot", text: (current ? current.text : "") + token, id: "streaming" },
+      ];
+    });
+  };
+
+  // Send a chat message and render the question as it streams in;
+  // returns the final reply payload and whether any tokens were shown
+  const sendChat = async (message) => {
+    const response = await apiFetch("/chat", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        message,
+        current_difficulty: currentDifficulty,
+        user_id: "guest", // You can replace with actual user ID if available
+        stream: true
+      }),
+    });
+
+    let streamed = false;
+    const data = await readChatReply(response, (token) => {
+      streamed = true;
+      appendStreamedToken(token);
+    });
+    return { data, streamed };
+  };
+
+  // Replace the streamed text with the authoritative final reply
+  const finishStreamedReply = (reply) => {
+    setMessages((prevMessages) => [
+      ...prevMessages.filter((msg) => msg.id !== "streaming"),
+      { sender: "bot", text: reply, id: Date.now() },
+    ]);
+  };
+
   // 🎤 Voice input using custom component that records audio and sends to backend
   const [isVoiceButtonDisabled, setIsVoiceButtonDisabled] = useState(false);
   
@@ -174,17 +216,7 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
     setLoading(true);
 
     try {
-      const response = await fetch("http://localhost:8000/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          message: input,
-          current_difficulty: currentDifficulty,
-          user_id: "guest" // You can replace with actual user ID if available
-        }),
-      });
-
-      const data = await response.json();
+      const { data, streamed } = await sendChat(input);
 
       // Debug logging
       console.log("Received data from backend:", data);
@@ -257,6 +289,9 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
           // Ensure we scroll to the bottom to show the resume feedback
           scrollToBottom();
         }
+      } else if (streamed) {
+        // The question was rendered as it streamed; settle it on the final reply
+        finishStreamedReply(data.reply);
       } else {
         // For normal responses, use typing effect
         setBotResponse(data.reply);
@@ -273,7 +308,9 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
             isTyping: true,
           },
         ]);
-        
+      }
+
+      if (!isExitCommand) {
         // If we have score information
         if (data.score !== undefined) {
           setScoreInfo({
@@ -309,6 +346,7 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
       }
     } catch (error) {
       console.error("Error in sendMessage:", error);
+      setMessages((prevMessages) => prevMessages.filter((msg) => msg.id !== "streaming"));
       const errorMessage = {
         sender: "bot",
         text: "❌ Server error. Try again.",
@@ -331,17 +369,7 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
     setLoading(true);
 
     try {
-      const response = await fetch("http://localhost:8000/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          message: transcript,
-          current_difficulty: currentDifficulty,
-          user_id: "guest"
-        }),
-      });
-
-      const data = await response.json();
+      const { data, streamed } = await sendChat(transcript);
       console.log("Auto-send response:", data);
 
       // Handle confidence score returned from backend
@@ -349,16 +377,20 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
         console.log(`Backend returned confidence score: ${data.confidence_score}`);
       }
 
-      // Begin typing effect for the bot's response
-      setBotResponse(data.reply || "Sorry, I didn't understand that.");
-      setTypingIndex(0);
-      setTypingEffect(true);
+      if (streamed) {
+        finishStreamedReply(data.reply || "Sorry, I didn't understand that.");
+      } else {
+        // Begin typing effect for the bot's response
+        setBotResponse(data.reply || "Sorry, I didn't understand that.");
+        setTypingIndex(0);
+        setTypingEffect(true);
 
-      // Add typing indicator
-      setMessages((prevMessages) => [
-        ...prevMessages,
-        { sender: "typing", text: "", id: "typing" },
-      ]);
+        // Add typing indicator
+        setMessages((prevMessages) => [
+          ...prevMessages,
+          { sender: "typing", text: "", id: "typing" },
+        ]);
+      }
 
       // Check if difficulty suggestion is included in response
       if (data.suggested_difficulty && data.suggested_difficulty !== currentDifficulty) {
@@ -369,6 +401,7 @@ const Chat = ({ initialDifficulty = "Easy", isResumeUploaded = false }) => {
       }
     } catch (error) {
       console.error("Error in sendTranscribedMessage:", error);
+      setMessages((prevMessages) => prevMessages.filter((msg) => msg.id !== "streaming"));
       const errorMessage = {
         sender: "bot",
         text: "❌ Server error. Try again.",
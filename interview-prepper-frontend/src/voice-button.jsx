@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect } from 'react';
 import './voice-button.css';
+import { apiFetch } from './api';
 
 const VoiceButton = ({ onTranscriptionReceived, disabled = false }) => {
   const [isRecording, setIsRecording] = useState(false);
@@ -281,7 +282,7 @@ const VoiceButton = ({ onTranscriptionReceived, disabled = false }) => {
         
         let response;
         try {
-          response = await fetch('http://localhost:8000/transcribe', {
+          response = await apiFetch('/transcribe', {
             method: 'POST',
             body: formData,
             signal: controller.signal
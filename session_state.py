@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from RL_module.dynamic_difficulty import DynamicDifficulty
+from Question_generation.prefetch import QuestionPrefetcher
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", str(24 * 60 * 60)))   # idle seconds before a session expires
+SESSION_MEMORY_ENTRIES = int(os.environ.get("SESSION_MEMORY_ENTRIES", "1024"))
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", "session_state.db")
+SESSION_HEADER = "X-Session-ID"
+SESSION_COOKIE = "session_id"
+
+
+class InterviewState:
+    """Everything one interview session needs between requests"""
+
+    def __init__(self, session_id, difficulty="Easy"):
+        self.session_id = session_id
+        self.resume_text = ""
+        self.resume_strengthening = ""
+        self.difficulty = difficulty
+        self.last_answer = ""
+        self.difficulty_adjuster = DynamicDifficulty(initial_difficulty=difficulty)
+        self.last_seen = time.time()
+        self._prefetcher = None
+
+    @property
+    def prefetcher(self):
+        # Created on first use; launches run on the executor shared by all sessions
+        if self._prefetcher is None:
+            self._prefetcher = QuestionPrefetcher()
+        return self._prefetcher
+
+    def discard_prefetch(self):
+        if self._prefetcher is not None:
+            self._prefetcher.discard()
+
+    def reset(self, difficulty="Easy"):
+        """Start a fresh interview in this session (new resume upload)"""
+        self.difficulty = difficulty
+        self.difficulty_adjuster = DynamicDifficulty(initial_difficulty=difficulty)
+        self.discard_prefetch()
+
+    def to_record(self):
+        return {
+            "resume_text": self.resume_text,
+            "resume_strengthening": self.resume_strengthening,
+            "difficulty": self.difficulty,
+            "last_answer": self.last_answer,
+            "difficulty_adjuster": self.difficulty_adjuster.to_dict()
+        }
+
+    @classmethod
+    def from_record(cls, session_id, record):
+        state = cls(session_id, record.get("difficulty", "Easy"))
+        state.resume_text = record.get("resume_text", "")
+        state.resume_strengthening = record.get("resume_strengthening", "")
+        state.last_answer = record.get("last_answer", "")
+        if record.get("difficulty_adjuster"):
+            state.difficulty_adjuster = DynamicDifficulty.from_dict(record["difficulty_adjuster"])
+        return state
+
+
+class SQLiteStateBackend:
+    """Persistent tier: one JSON record per session in a local SQLite file"""
+
+    def __init__(self, db_path=SESSION_STORE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_session_state_updated_at ON session_state (updated_at)")
+        self._conn.commit()
+
+    def load(self, session_id):
+        """(record, updated_at) or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, updated_at FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save(self, session_id, record, updated_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, record, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(record), updated_at)
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge(self, older_than, keep=()):
+        """Delete records not updated since older_than, except the session ids in keep"""
+        keep = set(keep)
+        with self._lock:
+            stale = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM session_state WHERE updated_at < ?", (older_than,)
+            ) if row[0] not in keep]
+            self._conn.executemany(
+                "DELETE FROM session_state WHERE session_id = ? AND updated_at < ?",
+                [(session_id, older_than) for session_id in stale]
+            )
+            self._conn.commit()
+        return len(stale)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM session_state").fetchone()[0]
+
+
+class SessionStore:
+    """
+    Per-session interview state: a bounded in-memory LRU in front of a
+    persistent backend (any object with load/save/delete/purge/count).
+
+    Sessions idle for longer than `ttl` seconds expire in both tiers. A
+    session evicted from memory is reloaded from the backend on its next
+    request, so the LRU bound caps memory without losing state. The backend
+    timestamp only moves on save, so sessions live in memory are never
+    purged from it and are written back with their last_seen on eviction.
+    """
+
+    def __init__(self, backend=None, ttl=SESSION_TTL, max_memory_entries=SESSION_MEMORY_ENTRIES, purge_every=256):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.purge_every = purge_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "backend_hits": 0, "created": 0, "evictions": 0, "expired": 0}
+        self._gets = 0
+
+    def _expired(self, last_seen, now):
+        return self.ttl > 0 and now - last_seen > self.ttl
+
+    def _evict(self, state):
+        if self.backend:
+            # Read-only requests keep last_seen fresh in memory only
+            self.backend.save(state.session_id, state.to_record(), state.last_seen)
+        state.discard_prefetch()
+        self._stats["evictions"] += 1
+
+    def get(self, session_id):
+        """The state for session_id, loaded from the backend or created if unknown or expired"""
+        now = time.time()
+        with self._lock:
+            self._gets += 1
+            if self._gets % self.purge_every == 0:
+                self._purge_locked(now)
+
+            state = self._memory.get(session_id)
+            if state is not None and self._expired(state.last_seen, now):
+                del self._memory[session_id]
+                state.discard_prefetch()
+                self._stats["expired"] += 1
+                state = None
+            if state is not None:
+                self._memory.move_to_end(session_id)
+                self._stats["memory_hits"] += 1
+            else:
+                loaded = self.backend.load(session_id) if self.backend else None
+                if loaded is not None and not self._expired(loaded[1], now):
+                    state = InterviewState.from_record(session_id, loaded[0])
+                    self._stats["backend_hits"] += 1
+                else:
+                    state = InterviewState(session_id)
+                    self._stats["created"] += 1
+                self._memory[session_id] = state
+                while len(self._memory) > self.max_memory_entries:
+                    _, evicted = self._memory.popitem(last=False)
+                    self._evict(evicted)
+            state.last_seen = now
+            return state
+
+    def save(self, state):
+        """Write a session through to the backend"""
+        state.last_seen = time.time()
+        if self.backend:
+            self.backend.save(state.session_id, state.to_record(), state.last_seen)
+
+    def delete(self, session_id):
+        with self._lock:
+            state = self._memory.pop(session_id, None)
+        if state is not None:
+            state.discard_prefetch()
+        if self.backend:
+            self.backend.delete(session_id)
+
+    def _purge_locked(self, now):
+        for session_id, state in list(self._memory.items()):
+            if self._expired(state.last_seen, now):
+                del self._memory[session_id]
+                state.discard_prefetch()
+                self._stats["expired"] += 1
+        if self.backend and self.ttl > 0:
+            self._stats["expired"] += self.backend.purge(now - self.ttl, keep=self._memory.keys())
+
+    def prefetch_stats(self):
+        """Prefetch counters summed over the sessions in memory"""
+        with self._lock:
+            prefetchers = [s._prefetcher for s in self._memory.values() if s._prefetcher is not None]
+        totals = {}
+        for prefetcher in prefetchers:
+            for key, value in prefetcher.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        if self.backend:
+            stats["backend_entries"] = self.backend.count()
+        return stats
+
+
+def session_id_from_request(request):
+    """Session id from the X-Session-ID header, then the session cookie; None if the client has none yet"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        session_id = session_id.strip()[:64]
+    return session_id or None
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+def attach_session_id(response, session_id, issued=False):
+    """Echo the session id in the X-Session-ID header, and set the cookie when the id was just issued"""
+    response.headers[SESSION_HEADER] = session_id
+    if issued:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=int(SESSION_TTL) if SESSION_TTL > 0 else None,
+                            httponly=True, samesite="Lax")
+    return response
+
+
+def create_session_store():
+    try:
+        backend = SQLiteStateBackend(SESSION_STORE_PATH) if SESSION_STORE_PATH else None
+    except sqlite3.Error as e:
+        print(f"⚠️ Session persistence disabled ({SESSION_STORE_PATH}): {e}")
+        backend = None
+    return SessionStore(backend)
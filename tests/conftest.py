@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Point the models at a throwaway database before anything imports them
+os.environ.setdefault("INTERVIEW_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="interview-tests-"), "interview.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
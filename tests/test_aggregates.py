@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from Question_generation.models import InterviewQA, Session, archive_session, rebuild_aggregates
+
+AGGREGATE_QUERY = text(
+    "SELECT user_id, day, difficulty, count, score_mean, score_m2, confidence_mean, confidence_m2 "
+    "FROM performance_aggregates ORDER BY user_id, day, difficulty"
+)
+
+
+@pytest.fixture
+def db():
+    db = Session()
+    db.execute(text("DELETE FROM interview_qa"))
+    db.execute(text("DELETE FROM performance_aggregates"))
+    db.commit()
+    yield db
+    db.rollback()
+    db.close()
+
+
+def aggregates(db):
+    return [tuple(row) for row in db.execute(AGGREGATE_QUERY)]
+
+
+def assert_same_aggregates(incremental, rebuilt):
+    assert len(incremental) == len(rebuilt)
+    for got, expected in zip(incremental, rebuilt):
+        assert got[:4] == expected[:4]
+        assert got[4:] == pytest.approx(expected[4:], abs=1e-6)
+
+
+def test_incremental_aggregates_match_rebuild(db):
+    day1 = datetime.datetime(2026, 3, 1, 9, 30)
+    day2 = datetime.datetime(2026, 3, 2, 14, 0)
+    scored = [
+        ("alice", "s1", "Easy", 7.0, 6.5, day1),
+        ("alice", "s1", "Easy", 9.0, 8.0, day1),
+        ("alice", "s1", "Medium", 4.0, None, day1),
+        ("alice", "s2", "Easy", 5.0, 7.0, day2),
+        ("bob", "s3", "Hard", 8.5, 9.0, day1),
+        ("bob", "s3", "Hard", 3.0, 2.5, day1),
+        ("bob", "s3", "Hard", 6.0, 5.0, day1),
+    ]
+    rows = []
+    for user_id, session_id, difficulty, score, confidence, scored_at in scored:
+        row = InterviewQA(user_id=user_id, session_id=session_id, question="q", answer="a", difficulty=difficulty,
+                          score=score, confidence_score=confidence, scored_at=scored_at)
+        db.add(row)
+        rows.append(row)
+    # Unscored rows (pending or failed evaluation) stay out of the aggregates
+    db.add(InterviewQA(user_id="alice", session_id="s2", question="q", answer="", difficulty="Easy"))
+    db.add(InterviewQA(user_id="bob", session_id="s3", question="q", answer="a", difficulty="Hard",
+                       feedback="Evaluation unavailable: the evaluator could not be reached."))
+    db.commit()
+
+    # Re-score rows, including moves to another bucket and out of the aggregates
+    rows[0].score = 2.0
+    rows[1].confidence_score = 3.0
+    rows[2].difficulty = "Hard"
+    rows[3].scored_at = day1
+    rows[5].scored_at = None
+    db.commit()
+    rows[4].score = 10.0
+    db.commit()
+
+    # Archiving hides an interview from the hot paths but keeps its scores
+    archive_session(db, "s1")
+    db.commit()
+
+    incremental = aggregates(db)
+    assert incremental
+
+    rebuild_aggregates(db)
+    db.commit()
+    assert_same_aggregates(incremental, aggregates(db))
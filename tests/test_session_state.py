@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from session_state import SessionStore, SQLiteStateBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteStateBackend(str(tmp_path / "sessions.db"))
+
+
+def test_purge_keeps_sessions_live_in_memory(backend):
+    store = SessionStore(backend, ttl=60, max_memory_entries=1, purge_every=1)
+    state = store.get("reader")
+    state.resume_text = "resume"
+    store.save(state)
+
+    # Only read-only requests after the save: the backend row ages past the ttl
+    backend.save("reader", state.to_record(), time.time() - 120)
+    store.get("reader")
+    assert backend.load("reader") is not None
+
+    # Evicting the reader writes its last_seen back, so it reloads with its state
+    store.get("other")
+    assert store.get("reader").resume_text == "resume"
+
+
+def test_purge_deletes_stale_sessions_not_in_memory(backend):
+    backend.save("stale", {"difficulty": "Easy"}, time.time() - 120)
+    store = SessionStore(backend, ttl=60, purge_every=1)
+    store.get("fresh")
+    assert backend.load("stale") is None
@@ -0,0 +1,51 @@
+import re
+
+import pytest
+
+from Question_generation.llm_utils import ThinkStripper
+
+SAMPLES = [
+    "<think>reasoning about the resume</think>\n\nWhat motivated your move to Acme?",
+    "  <think>a</think>Tell me about a conflict <b>you</b> resolved.",
+    "No reasoning block here, just a question?",
+    "Question first <think>late thoughts</think> and the rest.",
+    "<think>one</think>Answer <think>kept</think> as is.",
+    "<think>never closed, so the text stays",
+    "Ends with a partial tag <thi",
+]
+
+
+def reference(text):
+    # What the non-streaming path shows: remove_first_think() then strip()
+    return re.sub(r'<think>.*?</think>', '', text, count=1, flags=re.DOTALL).strip()
+
+
+def stream(chunks):
+    stripper = ThinkStripper()
+    visible = [stripper.feed(chunk) for chunk in chunks]
+    visible.append(stripper.flush())
+    return visible
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_every_single_split_matches_full_completion(text):
+    for cut in range(len(text) + 1):
+        assert "".join(stream([text[:cut], text[cut:]])).strip() == reference(text), cut
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_character_by_character_matches_full_completion(text):
+    assert "".join(stream(list(text))).strip() == reference(text)
+
+
+def test_splits_inside_tags_hold_back_only_the_think_block():
+    chunks = ["<th", "ink>plan the", " question</thi", "nk>\n", "Why ", "Python?"]
+    visible = stream(chunks)
+    assert visible[:4] == ["", "", "", ""]
+    assert visible[4:] == ["Why ", "Python?", ""]
+
+
+def test_partial_open_tag_is_released_once_it_cannot_be_a_tag():
+    stripper = ThinkStripper()
+    assert stripper.feed("Hello <th") == "Hello "
+    assert stripper.feed("ere") == "<there"